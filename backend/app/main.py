@@ -1,11 +1,26 @@
 import os
 import asyncio
+import fcntl
+import heapq
+import json
+import math
+import mmap
+import re
+import struct
+import time
+import zlib
+from array import array
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from functools import lru_cache
-from typing import Dict, List, Optional, Any
+from typing import Awaitable, Callable, Dict, List, Optional, Any
 from datetime import datetime, timedelta
 import uuid
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import httpx
 from dotenv import load_dotenv
@@ -23,6 +38,36 @@ class Settings:
     KROGER_CLIENT_SECRET: str = os.getenv("KROGER_CLIENT_SECRET", "")
     KROGER_API_BASE_URL: str = os.getenv("KROGER_API_BASE_URL", "https://api.kroger.com/v1")
     DEV_MODE: bool = os.getenv("DEV_MODE", "").lower() in {"1", "true", "yes"} or (not os.getenv("KROGER_CLIENT_ID") or not os.getenv("KROGER_CLIENT_SECRET"))
+    # Background cache warming for popular searches and nearby stores
+    PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "true").lower() in {"1", "true", "yes"}
+    PREFETCH_INTERVAL_SECONDS: int = int(os.getenv("PREFETCH_INTERVAL_SECONDS", "60"))
+    PREFETCH_TOP_TERMS: int = int(os.getenv("PREFETCH_TOP_TERMS", "10"))
+    PREFETCH_CALLS_PER_MINUTE: int = int(os.getenv("PREFETCH_CALLS_PER_MINUTE", "30"))
+    PREFETCH_FRESH_SECONDS: int = int(os.getenv("PREFETCH_FRESH_SECONDS", "60"))
+    PREFETCH_MAX_QUEUED: int = int(os.getenv("PREFETCH_MAX_QUEUED", "500"))
+    # Max stores queried at once by multi-store endpoints
+    COMPARE_CONCURRENCY: int = int(os.getenv("COMPARE_CONCURRENCY", "5"))
+    # Shared state for multi-worker deployments; empty keeps everything in process memory
+    REDIS_URL: str = os.getenv("REDIS_URL", "")
+    # Seconds shutdown waits for in-flight Kroger calls before closing connections
+    UPSTREAM_DRAIN_SECONDS: int = int(os.getenv("UPSTREAM_DRAIN_SECONDS", "20"))
+    # Time budget for a whole API request; clients may ask for less with X-Request-Deadline-Ms
+    REQUEST_DEADLINE_SECONDS: float = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))
+    # Duplicate slow idempotent GETs after the path's p95 latency, for at most this fraction of calls
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "true").lower() in {"1", "true", "yes"}
+    HEDGE_MAX_FRACTION: float = float(os.getenv("HEDGE_MAX_FRACTION", "0.1"))
+    # Background job workers per process, per-job time limit and how long results are kept
+    JOB_CONCURRENCY: int = int(os.getenv("JOB_CONCURRENCY", "2"))
+    JOB_TIMEOUT_SECONDS: int = int(os.getenv("JOB_TIMEOUT_SECONDS", "120"))
+    JOB_RESULT_TTL_SECONDS: int = int(os.getenv("JOB_RESULT_TTL_SECONDS", "600"))
+    # Events buffered per change-feed subscriber before it is told to resync
+    CHANGE_QUEUE_SIZE: int = int(os.getenv("CHANGE_QUEUE_SIZE", "100"))
+    # On-disk products_cache snapshots restored lazily after a restart; empty path disables
+    SNAPSHOT_PATH: str = os.getenv("SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "products_cache.snap"))
+    SNAPSHOT_INTERVAL_SECONDS: int = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+    SNAPSHOT_MAX_AGE_SECONDS: int = int(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "1800"))
+    # Append-only log of observed price changes; empty keeps history in memory only
+    PRICE_HISTORY_PATH: str = os.getenv("PRICE_HISTORY_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "price_history.bin"))
 
 
 @lru_cache
@@ -79,18 +124,525 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Partial-Result"],
 )
 
+
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    """Give each request a deadline for upstream calls and report partial results."""
+    settings = get_settings()
+    budget = settings.REQUEST_DEADLINE_SECONDS
+    try:
+        requested = float(request.headers.get("X-Request-Deadline-Ms", "")) / 1000
+        if requested > 0:
+            budget = min(budget, requested)
+    except ValueError:
+        pass
+    state = {"deadline": time.monotonic() + budget, "partial": False}
+    token = _request_state.set(state)
+    try:
+        response = await call_next(request)
+    finally:
+        _request_state.reset(token)
+    if state["partial"]:
+        response.headers["X-Partial-Result"] = "true"
+    return response
+
+_MISSING = object()
+
+
+class LocalDict:
+    """
+    Process-local key/value table with the same awaitable interface as RedisDict, so
+    handlers read and write state the same way whichever store backs it.
+    """
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        return [self.data.get(k) for k in keys]
+
+    async def set(self, key: str, value: Any) -> None:
+        self.data[key] = value
+
+    async def add(self, key: str, value: Any) -> bool:
+        """Set a value only if the key is absent; returns whether it was set."""
+        if key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    async def delete(self, key: str) -> bool:
+        return self.data.pop(key, _MISSING) is not _MISSING
+
+    async def contains(self, key: str) -> bool:
+        return key in self.data
+
+    async def keys(self) -> list[str]:
+        return list(self.data)
+
+    async def items(self) -> list[tuple[str, Any]]:
+        return list(self.data.items())
+
+    async def values(self) -> list[Any]:
+        return list(self.data.values())
+
+    async def count(self) -> int:
+        return len(self.data)
+
+    async def clear(self) -> None:
+        self.data.clear()
+
+    async def modify(self, key: str, fn: Callable[[Any], Any]) -> Any:
+        """Replace a value with fn(current value or None) atomically; fn returning None leaves it as is."""
+        value = fn(self.data.get(key))
+        if value is not None:
+            self.data[key] = value
+        return value
+
+
 # In-memory storage for shopping lists and cart
 class InMemoryStore:
     def __init__(self):
-        self.cart: Dict[str, CartItem] = {}
-        self.lists: Dict[str, ShoppingList] = {}
-        self.token_cache: Dict[str, Dict[str, Any]] = {}
+        self.cart = LocalDict()  # productId -> CartItem
+        self.lists = LocalDict()  # list ID -> ShoppingList
+        self.token_cache = LocalDict()
         # Cache aggregated product search results by (locationId, term)
-        self.products_cache: Dict[str, Dict[str, Any]] = {}
+        self.products_cache = LocalDict()
+        # Search term popularity per location, used by the prefetch scheduler
+        self.query_stats = LocalDict()
+        # Stores last returned together by locations_nearby, keyed by locationId
+        self.nearby_locations = LocalDict()
+        # locationId -> {products_cache key: expires_at timestamp}, so per-store scans skip other stores
+        self.cache_index: Dict[str, Dict[str, float]] = {}
+        self.budgets: Dict[str, tuple[int, int]] = {}
+        # Background jobs by ID, dedupe key -> job ID, and the queue of job IDs to run
+        self.jobs = LocalDict()
+        self.job_keys = LocalDict()
+        self.job_queue: deque[str] = deque()
+        self.change_version = 0
+
+    async def take_budget(self, name: str, cost: int, per_minute: int) -> bool:
+        """Reserve `cost` upstream calls from a per-minute budget; False when exhausted."""
+        minute = int(datetime.now().timestamp() // 60)
+        window, used = self.budgets.get(name, (minute, 0))
+        if window != minute:
+            used = 0
+        if used + cost > per_minute:
+            return False
+        self.budgets[name] = (minute, used + cost)
+        return True
+
+    async def budget_used(self, name: str) -> int:
+        minute = int(datetime.now().timestamp() // 60)
+        window, used = self.budgets.get(name, (minute, 0))
+        return used if window == minute else 0
+
+    async def try_lock(self, name: str, ttl: int) -> bool:
+        """Claim a short-lived lock so only one worker runs a periodic task; always True in-process."""
+        return True
+
+    async def enqueue_job(self, job_id: str) -> None:
+        self.job_queue.append(job_id)
+
+    async def dequeue_job(self) -> Optional[str]:
+        return self.job_queue.popleft() if self.job_queue else None
+
+    async def next_change_version(self) -> int:
+        self.change_version += 1
+        return self.change_version
+
+    async def index_cache_key(self, location_id: str, key: str, expires_at: float) -> None:
+        self.cache_index.setdefault(location_id, {})[key] = expires_at
+
+    async def cache_keys(self, location_id: str) -> list[str]:
+        """products_cache keys for a location whose entries haven't expired."""
+        now = datetime.now().timestamp()
+        keys = self.cache_index.get(location_id, {})
+        for key in [k for k, expires_at in keys.items() if expires_at <= now]:
+            del keys[key]
+        return list(keys)
+
+    async def close(self) -> None:
+        pass
+
+
+def _json_default(o: Any) -> Any:
+    if isinstance(o, datetime):
+        return {"__datetime__": o.isoformat()}
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _json_object_hook(d: Dict[str, Any]) -> Any:
+    if len(d) == 1 and "__datetime__" in d:
+        return datetime.fromisoformat(d["__datetime__"])
+    return d
+
+
+class RedisDict:
+    """
+    Awaitable view over Redis keys sharing a prefix, so every worker sees the same state.
+
+    Values are JSON (or a pydantic model's JSON). Without a TTL an index sorted set keeps
+    insertion order, like a dict; with a TTL entries expire on their own and iteration
+    falls back to SCAN. Values are copies: mutate, then assign back to persist.
+    """
+
+    def __init__(self, client: Any, prefix: str, model: Optional[type[BaseModel]] = None, ttl: Optional[int] = None):
+        self.client = client
+        self.prefix = prefix
+        self.model = model
+        self.ttl = ttl
+        self.index = None if ttl else f"{prefix}__index__"
+
+    def _dumps(self, value: Any) -> str:
+        if self.model is not None:
+            return value.model_dump_json()
+        return json.dumps(value, default=_json_default)
+
+    def _loads(self, raw: str) -> Any:
+        if self.model is not None:
+            return self.model.model_validate_json(raw)
+        return json.loads(raw, object_hook=_json_object_hook)
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        raw = await self.client.get(self.prefix + key)
+        return default if raw is None else self._loads(raw)
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        # One MGET instead of a round trip per key
+        if not keys:
+            return []
+        raws = await self.client.mget([self.prefix + k for k in keys])
+        return [None if raw is None else self._loads(raw) for raw in raws]
+
+    async def set(self, key: str, value: Any) -> None:
+        async with self.client.pipeline() as pipe:
+            pipe.set(self.prefix + key, self._dumps(value), ex=self.ttl)
+            if self.index:
+                pipe.zadd(self.index, {key: datetime.now().timestamp()}, nx=True)
+            await pipe.execute()
+
+    async def add(self, key: str, value: Any) -> bool:
+        """SET NX: set a value only if the key is absent, atomically across workers."""
+        if not await self.client.set(self.prefix + key, self._dumps(value), ex=self.ttl, nx=True):
+            return False
+        if self.index:
+            await self.client.zadd(self.index, {key: datetime.now().timestamp()}, nx=True)
+        return True
+
+    async def delete(self, key: str) -> bool:
+        async with self.client.pipeline() as pipe:
+            pipe.delete(self.prefix + key)
+            if self.index:
+                pipe.zrem(self.index, key)
+            deleted, *_ = await pipe.execute()
+        return bool(deleted)
+
+    async def contains(self, key: str) -> bool:
+        return bool(await self.client.exists(self.prefix + key))
+
+    async def keys(self) -> list[str]:
+        if self.index:
+            return await self.client.zrange(self.index, 0, -1)
+        return [k[len(self.prefix):] async for k in self.client.scan_iter(match=self.prefix + "*", count=500)]
+
+    async def items(self) -> list[tuple[str, Any]]:
+        keys = await self.keys()
+        values = await self.get_many(keys)
+        return [(k, v) for k, v in zip(keys, values) if v is not None]
+
+    async def values(self) -> list[Any]:
+        return [v for _, v in await self.items()]
+
+    async def count(self) -> int:
+        if self.index:
+            return await self.client.zcard(self.index)
+        return len(await self.keys())
+
+    async def clear(self) -> None:
+        keys = [self.prefix + k for k in await self.keys()]
+        if self.index:
+            keys.append(self.index)
+        for i in range(0, len(keys), 500):
+            await self.client.delete(*keys[i : i + 500])
+
+    async def modify(self, key: str, fn: Callable[[Any], Any]) -> Any:
+        """
+        Read-modify-write under WATCH/MULTI so concurrent updates from other workers aren't
+        lost; `fn` is re-run on the fresh value if the key changes before the write.
+        """
+        from redis.exceptions import WatchError
+
+        name = self.prefix + key
+        async with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(name)
+                    raw = await pipe.get(name)
+                    value = fn(None if raw is None else self._loads(raw))
+                    if value is None:
+                        return None
+                    pipe.multi()
+                    pipe.set(name, self._dumps(value), ex=self.ttl)
+                    if self.index:
+                        pipe.zadd(self.index, {key: datetime.now().timestamp()}, nx=True)
+                    await pipe.execute()
+                    return value
+                except WatchError:
+                    continue
+
+
+class RedisStore(InMemoryStore):
+    """
+    InMemoryStore backed by Redis so cart, lists, token and caches are shared across workers.
+    Uses the asyncio client, so a Redis round trip never blocks the worker's event loop.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis.asyncio as aioredis
+
+        self.client = aioredis.from_url(url, decode_responses=True)
+        # Binary-safe client for packed records (price history)
+        self.raw_client = aioredis.from_url(url)
+        self.cart = RedisDict(self.client, "kroger:cart:", model=CartItem)
+        self.lists = RedisDict(self.client, "kroger:lists:", model=ShoppingList)
+        self.token_cache = RedisDict(self.client, "kroger:token:", ttl=3600)
+        self.products_cache = RedisDict(self.client, "kroger:products:", ttl=3600)
+        self.query_stats = RedisDict(self.client, "kroger:query_stats:", ttl=7 * 24 * 3600)
+        self.nearby_locations = RedisDict(self.client, "kroger:nearby:", ttl=7 * 24 * 3600)
+        job_ttl = get_settings().JOB_RESULT_TTL_SECONDS
+        self.jobs = RedisDict(self.client, "kroger:jobs:", ttl=job_ttl)
+        self.job_keys = RedisDict(self.client, "kroger:job_keys:", ttl=job_ttl)
+
+    async def take_budget(self, name: str, cost: int, per_minute: int) -> bool:
+        minute = int(datetime.now().timestamp() // 60)
+        key = f"kroger:budget:{name}:{minute}"
+        async with self.client.pipeline() as pipe:
+            pipe.incrby(key, cost)
+            pipe.expire(key, 120)
+            used, _ = await pipe.execute()
+        if used > per_minute:
+            await self.client.decrby(key, cost)
+            return False
+        return True
 
-store = InMemoryStore()
+    async def budget_used(self, name: str) -> int:
+        minute = int(datetime.now().timestamp() // 60)
+        return int(await self.client.get(f"kroger:budget:{name}:{minute}") or 0)
+
+    async def try_lock(self, name: str, ttl: int) -> bool:
+        return bool(await self.client.set(f"kroger:lock:{name}", os.getpid(), nx=True, ex=max(ttl, 1)))
+
+    async def enqueue_job(self, job_id: str) -> None:
+        await self.client.rpush("kroger:job_queue", job_id)
+
+    async def dequeue_job(self) -> Optional[str]:
+        return await self.client.lpop("kroger:job_queue")
+
+    async def next_change_version(self) -> int:
+        return await self.client.incr("kroger:change_version")
+
+    async def index_cache_key(self, location_id: str, key: str, expires_at: float) -> None:
+        name = f"kroger:cache_index:{location_id}"
+        async with self.client.pipeline() as pipe:
+            pipe.zadd(name, {key: expires_at})
+            pipe.expire(name, 3600)
+            await pipe.execute()
+
+    async def cache_keys(self, location_id: str) -> list[str]:
+        # Scored by expiry, so expired keys are trimmed and skipped in the same round trip
+        name = f"kroger:cache_index:{location_id}"
+        async with self.client.pipeline() as pipe:
+            pipe.zremrangebyscore(name, "-inf", datetime.now().timestamp())
+            pipe.zrange(name, 0, -1)
+            _, keys = await pipe.execute()
+        return keys
+
+    async def close(self) -> None:
+        await self.client.aclose()
+        await self.raw_client.aclose()
+
+
+def _create_store(settings: Settings) -> InMemoryStore:
+    if settings.REDIS_URL:
+        logger.info("Using Redis for shared state")
+        return RedisStore(settings.REDIS_URL)
+    return InMemoryStore()
+
+
+store = _create_store(get_settings())
+
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=504, detail="Upstream deadline exceeded")
+
+
+# Per-request state shared with every task the request spawns: {"deadline": monotonic seconds, "partial": bool}
+_request_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_state", default=None)
+
+
+def _remaining_time() -> Optional[float]:
+    state = _request_state.get()
+    if not state or state.get("deadline") is None:
+        return None
+    return state["deadline"] - time.monotonic()
+
+
+def _mark_partial() -> None:
+    """Flag the current response as incomplete (sent as the X-Partial-Result header)."""
+    state = _request_state.get()
+    if state is not None:
+        state["partial"] = True
+
+
+def _is_partial() -> bool:
+    state = _request_state.get()
+    return bool(state and state.get("partial"))
+
+
+class _UpstreamSession:
+    def __init__(self, upstream: "UpstreamClient", timeout: float):
+        self.upstream = upstream
+        self.client = upstream._client()
+        self.timeout = timeout
+
+    def _timeout(self) -> tuple[float, bool]:
+        """Per-call timeout clipped to the request deadline, and whether the deadline is the limit."""
+        remaining = _remaining_time()
+        if remaining is None or remaining >= self.timeout:
+            return self.timeout, False
+        if remaining <= 0:
+            raise DeadlineExceeded()
+        return remaining, True
+
+    async def _bounded(self, call: Callable[[float], Awaitable[httpx.Response]]) -> httpx.Response:
+        """
+        Run an upstream call under a hard limit on its total time. httpx's timeout only
+        bounds each connect/read/write step, so a slowly trickled body would outlive it.
+        """
+        timeout, clipped = self._timeout()
+        try:
+            async with asyncio.timeout(timeout):
+                return await call(timeout)
+        except (TimeoutError, httpx.TimeoutException):
+            if clipped:
+                raise DeadlineExceeded()
+            raise httpx.ReadTimeout(f"Upstream call exceeded {timeout:.1f}s")
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self._bounded(lambda timeout: self.upstream.hedged_get(self.client, url, timeout, **kwargs))
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self._bounded(lambda timeout: self.client.post(url, timeout=timeout, **kwargs))
+
+
+class UpstreamClient:
+    """
+    Shared connection pool for Kroger API calls. Reusing connections avoids a TLS
+    handshake per request, and counting in-flight calls lets shutdown drain them.
+    """
+
+    def __init__(self):
+        self.client: Optional[httpx.AsyncClient] = None
+        self.inflight = 0
+        self.idle: Optional[asyncio.Event] = None
+        # Recent successful call latencies per API path, for hedging delays
+        self.latencies: Dict[str, deque] = {}
+        self.calls = 0
+        self.hedges = 0
+
+    def _client(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                timeout=15,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return self.client
+
+    def _hedge_delay(self, path: str) -> Optional[float]:
+        """p95 latency of recent calls to this path, or None until there are enough samples."""
+        samples = self.latencies.get(path)
+        if not samples or len(samples) < 20:
+            return None
+        ordered = sorted(samples)
+        return max(ordered[int(len(ordered) * 0.95) - 1], 0.05)
+
+    async def hedged_get(self, client: httpx.AsyncClient, url: str, timeout: float, **kwargs: Any) -> httpx.Response:
+        """
+        GET that sends a duplicate request if the first hasn't answered within the path's
+        p95 latency, returning whichever answers first. Hedges are capped at
+        HEDGE_MAX_FRACTION of calls so a slow upstream doesn't get twice the load.
+        """
+        settings = get_settings()
+        path = httpx.URL(url).path
+        started = time.monotonic()
+        self.calls += 1
+        first = asyncio.create_task(client.get(url, timeout=timeout, **kwargs))
+        delay = self._hedge_delay(path) if settings.HEDGE_ENABLED else None
+        if delay is not None and delay < timeout and self.hedges < settings.HEDGE_MAX_FRACTION * self.calls:
+            try:
+                done, _ = await asyncio.wait({first}, timeout=delay)
+            except asyncio.CancelledError:
+                # asyncio.wait doesn't cancel what it waits on, so a cancelled caller would orphan the request
+                first.cancel()
+                raise
+            if not done:
+                self.hedges += 1
+                second = asyncio.create_task(client.get(url, timeout=timeout - delay, **kwargs))
+                pending = {first, second}
+                error: Optional[BaseException] = None
+                try:
+                    while pending:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            if task.exception() is None:
+                                self.latencies.setdefault(path, deque(maxlen=200)).append(time.monotonic() - started)
+                                return task.result()
+                            error = task.exception()
+                    raise error
+                finally:
+                    for task in pending:
+                        task.cancel()
+        resp = await first
+        self.latencies.setdefault(path, deque(maxlen=200)).append(time.monotonic() - started)
+        return resp
+
+    @asynccontextmanager
+    async def session(self, timeout: float = 15):
+        if self.idle is None:
+            self.idle = asyncio.Event()
+        self.inflight += 1
+        self.idle.clear()
+        try:
+            yield _UpstreamSession(self, timeout)
+        finally:
+            self.inflight -= 1
+            if self.inflight == 0:
+                self.idle.set()
+
+    async def drain(self, timeout: float) -> None:
+        """Wait up to `timeout` seconds for in-flight calls to finish, then close the pool."""
+        if self.inflight and self.idle is not None:
+            logger.info(f"Draining {self.inflight} in-flight upstream calls")
+            try:
+                await asyncio.wait_for(self.idle.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Shutting down with {self.inflight} upstream calls still in flight")
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        self.idle = None
+
+
+upstream = UpstreamClient()
 
 
 async def get_token(settings: Settings) -> str:
@@ -101,13 +653,12 @@ async def get_token(settings: Settings) -> str:
         return "dev-token"
     
     # Check cache
-    if cache_key in store.token_cache:
-        cached = store.token_cache[cache_key]
-        if cached["expires_at"] > datetime.now():
-            return cached["token"]
+    cached = await store.token_cache.get(cache_key)
+    if cached and cached["expires_at"] > datetime.now():
+        return cached["token"]
     
     auth = httpx.BasicAuth(settings.KROGER_CLIENT_ID, settings.KROGER_CLIENT_SECRET)
-    async with httpx.AsyncClient(timeout=10) as client:
+    async with upstream.session(timeout=10) as client:
         resp = await client.post(
             f"{settings.KROGER_API_BASE_URL}/connect/oauth2/token",
             data={"grant_type": "client_credentials", "scope": "product.compact"},
@@ -119,10 +670,10 @@ async def get_token(settings: Settings) -> str:
         
         data = resp.json()
         # Cache the token (expire 5 minutes before actual expiry)
-        store.token_cache[cache_key] = {
+        await store.token_cache.set(cache_key, {
             "token": data["access_token"],
             "expires_at": datetime.now() + timedelta(seconds=data.get("expires_in", 1800) - 300)
-        }
+        })
         return data["access_token"]
 
 
@@ -158,7 +709,9 @@ async def locations_nearby(
                 "address": {"city": "Grove City", "state": "OH"},
             },
         ]
-        return samples[: max(1, min(limit, 50))]
+        samples = samples[: max(1, min(limit, 50))]
+        await _remember_nearby(samples)
+        return samples
     token = await get_token(settings)
     headers = {"Authorization": f"Bearer {token}"}
     params = {
@@ -166,12 +719,47 @@ async def locations_nearby(
         "filter.radiusInMiles": radius,
         "filter.limit": limit,
     }
-    async with httpx.AsyncClient(timeout=15) as client:
+    async with upstream.session(timeout=15) as client:
         resp = await client.get(f"{settings.KROGER_API_BASE_URL}/locations", headers=headers, params=params)
         if resp.status_code != 200:
             logger.error(f"Locations API error: {resp.status_code} - {resp.text}")
             raise HTTPException(status_code=resp.status_code, detail=resp.text)
-        return resp.json().get("data", [])
+        data = resp.json().get("data", [])
+        await _remember_nearby(data)
+        return data
+
+
+def _coordinates(location: dict) -> Optional[tuple[float, float]]:
+    """(latitude, longitude) from a Locations API entry's `geolocation`, if present."""
+    geo = location.get("geolocation") or {}
+    try:
+        return float(geo["latitude"]), float(geo["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _miles_between(a: tuple[float, float], b: tuple[float, float]) -> float:
+    """Great-circle distance in miles."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 3958.8 * 2 * math.asin(math.sqrt(h))
+
+
+async def _remember_nearby(locations: list[dict], per_store: int = 3) -> None:
+    """Record the closest neighbours of each returned store for prefetching store switches."""
+    stores = [(loc["locationId"], _coordinates(loc)) for loc in locations if isinstance(loc, dict) and loc.get("locationId")]
+    for i, (location_id, here) in enumerate(stores):
+
+        def closeness(j: int) -> tuple[int, float]:
+            there = stores[j][1]
+            if here and there:
+                return 0, _miles_between(here, there)
+            # Without coordinates, fall back to the distance-from-ZIP ordering (two stores at
+            # similar distances may still be on opposite sides of the ZIP)
+            return 1, abs(j - i)
+
+        others = sorted((j for j in range(len(stores)) if j != i), key=closeness)
+        await store.nearby_locations.set(location_id, [stores[j][0] for j in others[:per_store]])
 
 
 @app.get("/api/products/search")
@@ -185,6 +773,10 @@ async def products_search(
     category: Optional[str] = Query(None, description="Filter by category substring"),
     minPrice: Optional[float] = Query(None, description="Minimum price"),
     maxPrice: Optional[float] = Query(None, description="Maximum price"),
+    sortBy: Optional[str] = Query(None, pattern="^(price|unitPrice)$", description="Sort by effective price or price per unit"),
+    unit: Optional[str] = Query(None, pattern="^(oz|ct)$", description="Only products sized in this unit (oz covers weight and volume)"),
+    minUnitPrice: Optional[float] = Query(None, description="Minimum price per unit"),
+    maxUnitPrice: Optional[float] = Query(None, description="Maximum price per unit"),
 ):
     """Search for products at a specific Kroger location with optional filtering"""
     settings = get_settings()
@@ -224,11 +816,13 @@ async def products_search(
             out = [p for p in out if price_of(p) >= float(minPrice)]
         if maxPrice is not None:
             out = [p for p in out if price_of(p) <= float(maxPrice)]
+        out = _apply_unit_filters(out, sortBy, unit, minUnitPrice, maxUnitPrice)
         return out[: min(max(limit, 1), 200)]
 
     if settings.DEV_MODE:
         data = _sample_products(term)
         sliced = data[start : start + min(max(limit, 1), 50)]
+        await _ingest(locationId, sliced)
         return apply_filters(sliced)
 
     token = await get_token(settings)
@@ -239,12 +833,13 @@ async def products_search(
         "filter.limit": min(max(limit, 1), 50),
         "filter.start": max(start, 0),
     }
-    async with httpx.AsyncClient(timeout=15) as client:
+    async with upstream.session(timeout=15) as client:
         resp = await client.get(f"{settings.KROGER_API_BASE_URL}/products", headers=headers, params=params)
         if resp.status_code != 200:
             logger.error(f"Products search error: {resp.status_code} - {resp.text}")
             raise HTTPException(status_code=resp.status_code, detail=resp.text)
         items = resp.json().get("data", [])
+        await _ingest(locationId, items)
         return apply_filters(items)
 
 
@@ -252,12 +847,262 @@ def _cache_key_products(location_id: str, term: str, max_items: int) -> str:
     return f"products::{location_id}::{term.lower().strip()}::max{max_items}"
 
 
+async def _aggregate_products(settings: Settings, term: str, location_id: str, cap: int) -> tuple[list[dict], bool]:
+    """
+    Page through the Products API for a term/location and dedupe up to `cap` items.
+    Returns the items and whether paging completed; on hitting the request deadline
+    the pages fetched so far are returned and the response is flagged partial.
+    """
+    results: list[dict] = []
+    complete = True
+    if settings.DEV_MODE:
+        data = _sample_products(term)[: min(cap, 200)]
+        await _ingest(location_id, data)
+        return data, complete
+
+    token = await get_token(settings)
+    headers = {"Authorization": f"Bearer {token}"}
+    start = 0
+    step = 50
+    async with upstream.session(timeout=15) as client:
+        while len(results) < cap:
+            params = {
+                "filter.term": term,
+                "filter.locationId": location_id,
+                "filter.limit": min(step, 50),
+                "filter.start": start,
+            }
+            try:
+                resp = await client.get(f"{settings.KROGER_API_BASE_URL}/products", headers=headers, params=params)
+            except DeadlineExceeded:
+                logger.warning(f"Deadline hit aggregating '{term}' at {location_id} after {len(results)} items")
+                complete = False
+                _mark_partial()
+                break
+            if resp.status_code != 200:
+                logger.error(f"Aggregate products error: {resp.status_code} - {resp.text}")
+                break
+            raw = resp.json()
+            batch = raw.get("data", [])
+            # Attach raw details for modal richness when available
+            for p in batch:
+                if isinstance(p.get("images"), list):
+                    for e in p["images"]:
+                        if isinstance(e, dict) and "sizes" in e and isinstance(e["sizes"], list):
+                            # normalize sizes entries to ensure size/url keys exist
+                            e["sizes"] = [
+                                {"size": str(s.get("size", "")), "url": s.get("url")} for s in e["sizes"] if isinstance(s, dict)
+                            ]
+            if not batch:
+                break
+            results.extend(batch)
+            start += step
+            if len(batch) < step:
+                break
+    # Deduplicate by productId/upc while preserving order
+    seen: set[str] = set()
+    deduped: list[dict] = []
+    for p in results:
+        pid = p.get("productId") or p.get("upc") or None
+        if pid is None:
+            deduped.append(p)
+            continue
+        if pid in seen:
+            continue
+        seen.add(pid)
+        deduped.append(p)
+    await _ingest(location_id, deduped)
+    return deduped[:cap], complete
+
+
+async def _put_cached(cache_key: str, cached: Dict[str, Any]) -> None:
+    await store.products_cache.set(cache_key, cached)
+    # Every key shape is "<kind>::<locationId>::..."
+    await store.index_cache_key(cache_key.split("::")[1], cache_key, cached["expires_at"].timestamp())
+
+
+async def _cache_products(cache_key: str, items: list[dict], prefetched: bool = False, ttl_minutes: int = 2) -> None:
+    now = datetime.now()
+    # Cache with TTL 2 minutes unless told otherwise
+    await _put_cached(cache_key, {
+        "items": items,
+        "fetched_at": now,
+        "expires_at": now + timedelta(minutes=ttl_minutes),
+        "prefetched": prefetched,
+    })
+
+
+async def _get_cached(cache_key: str) -> Optional[Dict[str, Any]]:
+    """products_cache entry for a key, restoring it from the startup snapshot on a miss."""
+    cached = await store.products_cache.get(cache_key)
+    if cached is None and snapshots.index:
+        cached = await snapshots.restore(cache_key)
+    return cached
+
+
+class ProductSnapshots:
+    """
+    Periodic on-disk snapshots of `products_cache` so restarts come up warm.
+
+    File layout: MAGIC, a little-endian u32 index length, a zlib-compressed JSON index
+    {key: [offset, length, fetched_at]} and one zlib-compressed JSON segment per entry.
+    Startup reads only the index; segments are memory-mapped and decoded the first time
+    their key is requested, so a large snapshot never delays boot.
+    """
+
+    MAGIC = b"KSNAP1\n"
+
+    def __init__(self):
+        self.index: Dict[str, list] = {}
+        self.mm: Optional[mmap.mmap] = None
+        self.data_start = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def open(self, path: str, max_age_seconds: int) -> int:
+        """Map a snapshot file and read its index; returns the number of usable entries."""
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return 0
+        if mm[: len(self.MAGIC)] != self.MAGIC:
+            logger.warning(f"Ignoring snapshot with unknown format: {path}")
+            mm.close()
+            return 0
+        pos = len(self.MAGIC)
+        # A cache file must never block startup: a truncated or corrupt one is skipped
+        try:
+            (index_len,) = struct.unpack("<I", mm[pos : pos + 4])
+            pos += 4
+            index = json.loads(zlib.decompress(mm[pos : pos + index_len]))
+            oldest = datetime.now().timestamp() - max_age_seconds
+            self.index = {k: v for k, v in index.items() if v[2] >= oldest}
+        except (struct.error, zlib.error, ValueError, TypeError, AttributeError, IndexError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+            mm.close()
+            return 0
+        self.mm = mm
+        self.data_start = pos + index_len
+        return len(self.index)
+
+    def _read(self, cache_key: str, entry: list) -> Optional[list]:
+        offset, length, _ = entry
+        start = self.data_start + offset
+        try:
+            return json.loads(zlib.decompress(self.mm[start : start + length]))
+        except (zlib.error, ValueError):
+            logger.warning(f"Corrupt snapshot segment for {cache_key}")
+            return None
+
+    async def restore(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        # Each entry is restored at most once; afterwards the live cache owns it
+        entry = self.index.pop(cache_key, None)
+        if entry is None or self.mm is None:
+            return None
+        items = self._read(cache_key, entry)
+        if items is None:
+            return None
+        for p in items:
+            _annotate_unit_price(p)
+        now = datetime.now()
+        cached = {
+            "items": items,
+            "fetched_at": datetime.fromtimestamp(entry[2]),
+            "expires_at": now + timedelta(minutes=2),
+            "prefetched": False,
+            "restored": True,
+        }
+        await _put_cached(cache_key, cached)
+        return cached
+
+    @classmethod
+    def encode(cls, entries: list[tuple[str, list, float]]) -> bytes:
+        index: Dict[str, list] = {}
+        segments: list[bytes] = []
+        offset = 0
+        for key, items, fetched_at in entries:
+            seg = zlib.compress(json.dumps(items, separators=(",", ":")).encode(), 6)
+            index[key] = [offset, len(seg), fetched_at]
+            segments.append(seg)
+            offset += len(seg)
+        raw_index = zlib.compress(json.dumps(index).encode(), 6)
+        return b"".join([cls.MAGIC, struct.pack("<I", len(raw_index)), raw_index, *segments])
+
+    async def save(self, settings: Settings, final: bool = False) -> None:
+        # The periodic lock is held for a whole interval, so shutdown takes its own short
+        # one; when every worker stops at once only one of them writes the final snapshot
+        lock, ttl = ("snapshot_final", 30) if final else ("snapshot", settings.SNAPSHOT_INTERVAL_SECONDS)
+        if not await store.try_lock(lock, ttl):
+            return  # another worker is writing this round
+        oldest = datetime.now() - timedelta(seconds=settings.SNAPSHOT_MAX_AGE_SECONDS)
+        # Copy references on the event loop; compression and I/O happen off it
+        entries = [
+            (key, cached["items"], cached["fetched_at"].timestamp())
+            for key, cached in await store.products_cache.items()
+            if cached.get("items") and cached.get("fetched_at") and cached["fetched_at"] >= oldest
+        ]
+        # Entries not requested since startup are still worth carrying over
+        live = {key for key, _, _ in entries}
+        unrestored = [(key, entry) for key, entry in self.index.items() if key not in live and entry[2] >= oldest.timestamp()]
+
+        def write() -> int:
+            for key, entry in unrestored:
+                items = self._read(key, entry)
+                if items:
+                    entries.append((key, items, entry[2]))
+            data = self.encode(entries)
+            os.makedirs(os.path.dirname(settings.SNAPSHOT_PATH) or ".", exist_ok=True)
+            tmp = f"{settings.SNAPSHOT_PATH}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, settings.SNAPSHOT_PATH)
+            return len(data)
+
+        size = await asyncio.to_thread(write)
+        logger.info(f"Wrote product snapshot: {len(entries)} entries, {size} bytes")
+
+    async def run(self, settings: Settings) -> None:
+        while True:
+            await asyncio.sleep(settings.SNAPSHOT_INTERVAL_SECONDS)
+            try:
+                await self.save(settings)
+            except Exception as e:
+                logger.warning(f"Product snapshot failed: {e}")
+
+    def start(self, settings: Settings) -> None:
+        count = self.open(settings.SNAPSHOT_PATH, settings.SNAPSHOT_MAX_AGE_SECONDS)
+        if count:
+            logger.info(f"Product snapshot has {count} entries available for lazy restore")
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(settings))
+
+    async def stop(self, settings: Settings) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            await self.save(settings, final=True)
+        except Exception as e:
+            logger.warning(f"Final product snapshot failed: {e}")
+
+
+snapshots = ProductSnapshots()
+
+
 @app.get("/api/products/search/all")
 async def products_search_all(
     term: str = Query(..., description="Search term"),
     locationId: str = Query(..., description="Kroger location ID"),
     max: int = Query(300, description="Max items to aggregate (cap 400)"),
     fresh: bool = Query(False, description="Bypass server cache when true"),
+    sortBy: Optional[str] = Query(None, pattern="^(price|unitPrice)$", description="Sort by effective price or price per unit"),
+    unit: Optional[str] = Query(None, pattern="^(oz|ct)$", description="Only products sized in this unit (oz covers weight and volume)"),
+    minUnitPrice: Optional[float] = Query(None, description="Minimum price per unit"),
+    maxUnitPrice: Optional[float] = Query(None, description="Maximum price per unit"),
 ):
     """
     Aggregate up to `max` items for a term/location in a single backend call and cache it briefly.
@@ -266,75 +1111,239 @@ async def products_search_all(
     settings = get_settings()
     cap = min(max if max and max > 0 else 300, 400)
     cache_key = _cache_key_products(locationId, term, cap)
+    await prefetcher.record(locationId, term)
 
     # Serve from cache if fresh (5 minutes TTL)
-    cached = store.products_cache.get(cache_key)
+    cached = await _get_cached(cache_key)
     now = datetime.now()
-    if not fresh and cached and cached.get("expires_at") and cached["expires_at"] > now:
-        return cached["items"]
+    if cached and cached.get("expires_at") and cached["expires_at"] > now:
+        if not fresh:
+            return _apply_unit_filters(cached["items"], sortBy, unit, minUnitPrice, maxUnitPrice)
+        # Entries warmed by the prefetcher moments ago are as fresh as a new fetch
+        fetched_at = cached.get("fetched_at")
+        if cached.get("prefetched") and fetched_at and (now - fetched_at).total_seconds() <= settings.PREFETCH_FRESH_SECONDS:
+            return _apply_unit_filters(cached["items"], sortBy, unit, minUnitPrice, maxUnitPrice)
 
-    # Fetch and aggregate
-    results: list[dict] = []
-    if settings.DEV_MODE:
-        data = _sample_products(term)
-        results = data[: min(cap, 200)]
-    else:
-        token = await get_token(settings)
-        headers = {"Authorization": f"Bearer {token}"}
-        start = 0
-        step = 50
-        async with httpx.AsyncClient(timeout=15) as client:
-            while len(results) < cap:
-                params = {
-                    "filter.term": term,
-                    "filter.locationId": locationId,
-                    "filter.limit": min(step, 50),
-                    "filter.start": start,
-                }
-                resp = await client.get(f"{settings.KROGER_API_BASE_URL}/products", headers=headers, params=params)
-                if resp.status_code != 200:
-                    logger.error(f"Aggregate products error: {resp.status_code} - {resp.text}")
-                    break
-                raw = resp.json()
-                batch = raw.get("data", [])
-                # Attach raw details for modal richness when available
-                for p in batch:
-                    if isinstance(p.get("images"), list):
-                        for e in p["images"]:
-                            if isinstance(e, dict) and "sizes" in e and isinstance(e["sizes"], list):
-                                # normalize sizes entries to ensure size/url keys exist
-                                e["sizes"] = [
-                                    {"size": str(s.get("size", "")), "url": s.get("url")} for s in e["sizes"] if isinstance(s, dict)
-                                ]
-                if not batch:
-                    break
-                results.extend(batch)
-                start += step
-                if len(batch) < step:
-                    break
-        # Deduplicate by productId/upc while preserving order
-        seen: set[str] = set()
-        deduped: list[dict] = []
-        for p in results:
-            pid = p.get("productId") or p.get("upc") or None
-            if pid is None:
-                deduped.append(p)
+    results, complete = await _aggregate_products(settings, term, locationId, cap)
+    if complete:
+        await _cache_products(cache_key, results)
+    return _apply_unit_filters(results, sortBy, unit, minUnitPrice, maxUnitPrice)
+
+
+class PrefetchScheduler:
+    """
+    Warms `products_cache` ahead of user requests.
+
+    Search terms are counted per location; on every tick the most popular terms
+    are refreshed before their cache entry expires, and each search also queues
+    the same term for the stores last returned alongside it by `locations_nearby`
+    so store switches hit a warm cache. Upstream calls are bounded by a
+    per-minute budget so prefetching never eats the quota real users need.
+    The queue holds at most PREFETCH_MAX_QUEUED entries; when it is full the
+    least popular term is dropped, so one-off and typed-ahead terms go first.
+    """
+
+    CAP = 300  # matches the max the frontend requests from /api/products/search/all
+    PAGE_SIZE = 50
+    DECAY = 0.9
+    MAX_TERMS_PER_LOCATION = 200
+
+    def __init__(self):
+        self.pending: deque[tuple[str, str]] = deque()
+        # Queued (location, term) -> popularity score, for choosing what to drop when full
+        self.queued: Dict[tuple[str, str], float] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.wake = asyncio.Event()
+        self.stopping = False
+
+    async def record(self, location_id: str, term: str) -> None:
+        """Count a user search and queue the same term at nearby stores."""
+        t = (term or "").lower().strip()
+        if not t or not location_id:
+            return
+
+        def count(stats: Optional[Dict[str, float]]) -> Dict[str, float]:
+            stats = stats or {}
+            stats[t] = stats.get(t, 0.0) + 1.0
+            return stats
+
+        stats = await store.query_stats.modify(location_id, count)
+        for other in await store.nearby_locations.get(location_id, []):
+            self.enqueue(other, t, stats[t], urgent=True)
+
+    def enqueue(self, location_id: str, term: str, score: float, urgent: bool = False) -> None:
+        key = (location_id, term)
+        if key in self.queued:
+            self.queued[key] = max(self.queued[key], score)
+            return
+        if len(self.queued) >= get_settings().PREFETCH_MAX_QUEUED:
+            # Full, usually because the budget ran out: make room by dropping the least popular
+            # entry, oldest first on ties (typed-ahead prefixes are queued before the full term)
+            lowest = min(self.queued, key=self.queued.__getitem__)
+            if self.queued[lowest] > score:
+                return
+            del self.queued[lowest]
+            self.pending.remove(lowest)
+        self.queued[key] = score
+        if urgent:
+            self.pending.appendleft(key)
+            self.wake.set()
+        else:
+            self.pending.append(key)
+
+    @staticmethod
+    def _ranked(stats: Dict[str, float], n: int) -> list[tuple[str, float]]:
+        return sorted(stats.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+    async def top_terms(self, location_id: str, n: int) -> list[str]:
+        return [t for t, _ in self._ranked(await store.query_stats.get(location_id, {}), n)]
+
+    async def _decay(self) -> None:
+        # Favor recent popularity and keep the per-location tables bounded
+        def decay(stats: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+            if stats is None:
+                return None
+            stats = {t: n * self.DECAY for t, n in stats.items() if n * self.DECAY >= 0.1}
+            return dict(sorted(stats.items(), key=lambda kv: kv[1], reverse=True)[: self.MAX_TERMS_PER_LOCATION])
+
+        for location_id in await store.query_stats.keys():
+            await store.query_stats.modify(location_id, decay)
+
+    async def _is_warm(self, cache_key: str, horizon_seconds: int) -> bool:
+        cached = await _get_cached(cache_key)
+        if not cached or not cached.get("expires_at"):
+            return False
+        return cached["expires_at"] > datetime.now() + timedelta(seconds=horizon_seconds)
+
+    async def drain(self, settings: Settings) -> None:
+        """Prefetch queued (location, term) pairs until the queue or the budget runs out."""
+        # Upstream cost of one aggregation in the worst case (DEV_MODE makes no calls)
+        cost = 0 if settings.DEV_MODE else -(-self.CAP // self.PAGE_SIZE)
+        while self.pending and not self.stopping:
+            location_id, term = self.pending[0]
+            cache_key = _cache_key_products(location_id, term, self.CAP)
+            if await self._is_warm(cache_key, settings.PREFETCH_INTERVAL_SECONDS):
+                self.pending.popleft()
+                self.queued.pop((location_id, term), None)
                 continue
-            if pid in seen:
+            # The budget lives in the store so all workers share one upstream allowance
+            if not await store.take_budget("prefetch", cost, settings.PREFETCH_CALLS_PER_MINUTE):
+                return
+            self.pending.popleft()
+            self.queued.pop((location_id, term), None)
+            try:
+                items, complete = await _aggregate_products(settings, term, location_id, self.CAP)
+            except Exception as e:
+                logger.warning(f"Prefetch failed for {location_id}/{term}: {e}")
                 continue
-            seen.add(pid)
-            deduped.append(p)
-        results = deduped[:cap]
+            if items and complete:
+                await _cache_products(cache_key, items, prefetched=True)
+
+    async def run(self) -> None:
+        settings = get_settings()
+        interval = max(settings.PREFETCH_INTERVAL_SECONDS, 1)
+        next_refresh = datetime.now()
+        while not self.stopping:
+            if datetime.now() >= next_refresh:
+                # query_stats is shared, so only one worker per interval decays it
+                if await store.try_lock("prefetch_decay", interval):
+                    await self._decay()
+                for location_id, stats in await store.query_stats.items():
+                    for t, score in self._ranked(stats, settings.PREFETCH_TOP_TERMS):
+                        self.enqueue(location_id, t, score)
+                next_refresh = datetime.now() + timedelta(seconds=interval)
+            await self.drain(settings)
+            self.wake.clear()
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        self.stopping = False
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 0) -> None:
+        """Stop scheduling prefetches, let the one in progress finish within `timeout`, then cancel."""
+        self.stopping = True
+        self.wake.set()
+        if self.task is not None:
+            if timeout > 0:
+                await asyncio.wait({self.task}, timeout=timeout)
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+prefetcher = PrefetchScheduler()
+
+
+@app.on_event("startup")
+async def warm_up():
+    """Open the upstream pool and fetch a token so the first request doesn't pay for either."""
+    settings = get_settings()
+    upstream._client()
+    if not settings.DEV_MODE:
+        try:
+            await get_token(settings)
+        except HTTPException as e:
+            logger.warning(f"Token warmup failed: {e.detail}")
+    if settings.SNAPSHOT_PATH:
+        snapshots.start(settings)
+    count = await price_history.start(settings)
+    if count:
+        logger.info(f"Loaded {count} price history records")
+    if settings.PREFETCH_ENABLED:
+        prefetcher.start()
+    jobs.start(settings.JOB_CONCURRENCY)
+    changes.start(settings)
+
+
+@app.on_event("shutdown")
+async def shut_down():
+    """Stop background work, let in-flight upstream calls finish, then snapshot the caches."""
+    settings = get_settings()
+    deadline = time.monotonic() + settings.UPSTREAM_DRAIN_SECONDS
+    # HTTP requests are done by now, so prefetches and jobs are the upstream calls left to drain:
+    # stop scheduling new ones, give the running ones the drain window, then cancel the rest
+    await asyncio.gather(
+        prefetcher.stop(settings.UPSTREAM_DRAIN_SECONDS),
+        jobs.stop(settings.UPSTREAM_DRAIN_SECONDS),
+    )
+    await changes.stop()
+    if settings.SNAPSHOT_PATH:
+        await snapshots.stop(settings)
+    price_history.close()
+    await upstream.drain(max(deadline - time.monotonic(), 0))
+    await store.close()
+
 
-    # Cache with TTL 2 minutes
-    store.products_cache[cache_key] = {
-        "items": results,
-        "expires_at": now + timedelta(minutes=2),
+@app.get("/api/prefetch/stats")
+async def prefetch_stats(locationId: Optional[str] = Query(None, description="Limit to one location")):
+    """Popular terms per location and the current prefetch queue."""
+    settings = get_settings()
+    locations = [locationId] if locationId else await store.query_stats.keys()
+    return {
+        "topTerms": {loc: await prefetcher.top_terms(loc, settings.PREFETCH_TOP_TERMS) for loc in locations},
+        "queued": len(prefetcher.pending),
+        "callsThisMinute": await store.budget_used("prefetch"),
+        "budgetPerMinute": settings.PREFETCH_CALLS_PER_MINUTE,
     }
-    return results
 
 @app.get("/api/products/sales")
-async def products_sales(locationId: str, term: str, limit: int = 50):
+async def products_sales(
+    locationId: str,
+    term: str,
+    limit: int = 50,
+    sortBy: Optional[str] = Query(None, pattern="^(price|unitPrice)$", description="Sort by effective price or price per unit"),
+    unit: Optional[str] = Query(None, pattern="^(oz|ct)$", description="Only products sized in this unit (oz covers weight and volume)"),
+    minUnitPrice: Optional[float] = Query(None, description="Minimum price per unit"),
+    maxUnitPrice: Optional[float] = Query(None, description="Maximum price per unit"),
+):
     """
     Returns products for the given term and location where a promo price exists
     and is lower than the regular price.
@@ -346,6 +1355,7 @@ async def products_sales(locationId: str, term: str, limit: int = 50):
     settings = get_settings()
     if settings.DEV_MODE:
         items = _sample_products(term)
+        await _ingest(locationId, items)
         def is_on_sale(p: dict) -> bool:
             try:
                 it = (p.get("items") or [{}])[0]
@@ -355,7 +1365,8 @@ async def products_sales(locationId: str, term: str, limit: int = 50):
                 return isinstance(promo, (int, float)) and promo > 0 and (reg is None or promo < reg)
             except Exception:
                 return False
-        return [p for p in items if is_on_sale(p)][: min(max(limit, 1), 50)]
+        sale_items = _apply_unit_filters([p for p in items if is_on_sale(p)], sortBy, unit, minUnitPrice, maxUnitPrice)
+        return sale_items[: min(max(limit, 1), 50)]
     token = await get_token(settings)
     headers = {"Authorization": f"Bearer {token}"}
     params = {
@@ -363,11 +1374,12 @@ async def products_sales(locationId: str, term: str, limit: int = 50):
         "filter.location.id": locationId,
         "filter.limit": min(max(limit, 1), 50),
     }
-    async with httpx.AsyncClient(timeout=15) as client:
+    async with upstream.session(timeout=15) as client:
         resp = await client.get(f"{settings.KROGER_API_BASE_URL}/products", headers=headers, params=params)
         if resp.status_code != 200:
             raise HTTPException(status_code=resp.status_code, detail=resp.text)
         items = resp.json().get("data", [])
+        await _ingest(locationId, items)
         def is_on_sale(p: dict) -> bool:
             try:
                 it = (p.get("items") or [{}])[0]
@@ -377,20 +1389,30 @@ async def products_sales(locationId: str, term: str, limit: int = 50):
                 return isinstance(promo, (int, float)) and promo > 0 and (reg is None or promo < reg)
             except Exception:
                 return False
-        return [p for p in items if is_on_sale(p)]
+        return _apply_unit_filters([p for p in items if is_on_sale(p)], sortBy, unit, minUnitPrice, maxUnitPrice)
 
 
 @app.get("/api/products/sales/all")
 async def products_sales_all(
     locationId: str = Query(..., description="Kroger location ID"),
-    max: int = Query(150, description="Maximum number of sale items to return")
+    max: int = Query(150, description="Maximum number of sale items to return"),
+    fresh: bool = Query(False, description="Bypass server cache when true"),
+    sortBy: Optional[str] = Query(None, pattern="^(price|unitPrice)$", description="Sort by effective price or price per unit"),
+    unit: Optional[str] = Query(None, pattern="^(oz|ct)$", description="Only products sized in this unit (oz covers weight and volume)"),
+    minUnitPrice: Optional[float] = Query(None, description="Minimum price per unit"),
+    maxUnitPrice: Optional[float] = Query(None, description="Maximum price per unit"),
 ):
     """
     Attempts to gather a broad set of on-sale products for a location by issuing
     multiple term-based searches and deduplicating the results, then filtering on
     promo < regular. Public Products API doesn't provide a direct "all sales" endpoint.
+    Results are cached per location for 10 minutes.
     """
     settings = get_settings()
+    cache_key = f"sales::{locationId}"
+    cached = None if fresh else await _get_cached(cache_key)
+    if cached and cached.get("expires_at") and cached["expires_at"] > datetime.now():
+        return _apply_unit_filters(cached["items"], sortBy, unit, minUnitPrice, maxUnitPrice)[: max if max > 0 else 150]
     if settings.DEV_MODE:
         # Aggregate over multiple seed terms locally
         seeds = [
@@ -405,6 +1427,7 @@ async def products_sales_all(
                     continue
                 seen.add(pid)
                 collected.append(p)
+        await _ingest(locationId, collected)
         def is_on_sale(p: dict) -> bool:
             try:
                 it = (p.get("items") or [{}])[0]
@@ -415,7 +1438,8 @@ async def products_sales_all(
             except Exception:
                 return False
         sale_items = [p for p in collected if is_on_sale(p)]
-        return sale_items[: (max if max > 0 else 150)]
+        await _cache_products(cache_key, sale_items, ttl_minutes=10)
+        return _apply_unit_filters(sale_items, sortBy, unit, minUnitPrice, maxUnitPrice)[: (max if max > 0 else 150)]
     token = await get_token(settings)
     headers = {"Authorization": f"Bearer {token}"}
 
@@ -431,8 +1455,12 @@ async def products_sales_all(
             "filter.locationId": locationId,
             "filter.limit": 50,
         }
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.get(f"{settings.KROGER_API_BASE_URL}/products", headers=headers, params=params)
+        async with upstream.session(timeout=15) as client:
+            try:
+                resp = await client.get(f"{settings.KROGER_API_BASE_URL}/products", headers=headers, params=params)
+            except DeadlineExceeded:
+                # Return the seeds that made it in time rather than waiting on the slowest
+                return None
             if resp.status_code != 200:
                 return []
             return resp.json().get("data", [])
@@ -445,15 +1473,19 @@ async def products_sales_all(
             return await fetch_seed(seed)
 
     results = await asyncio.gather(*[guarded(s) for s in seeds])
+    partial = any(batch is None for batch in results)
+    if partial:
+        _mark_partial()
     all_items = []
     seen = set()
     for batch in results:
-        for p in batch:
+        for p in batch or []:
             pid = p.get("productId") or p.get("upc")
             if pid in seen:
                 continue
             seen.add(pid)
             all_items.append(p)
+    await _ingest(locationId, all_items)
 
     def is_on_sale(p: dict) -> bool:
         try:
@@ -466,8 +1498,772 @@ async def products_sales_all(
             return False
 
     sale_items = [p for p in all_items if is_on_sale(p)]
+    if sale_items and not partial:
+        await _cache_products(cache_key, sale_items, ttl_minutes=10)
     # Cap to requested max
-    return sale_items[: max if max > 0 else 150]
+    return _apply_unit_filters(sale_items, sortBy, unit, minUnitPrice, maxUnitPrice)[: max if max > 0 else 150]
+
+
+# Cross-store price comparison
+def _price_info(p: dict) -> Dict[str, Optional[float]]:
+    """Regular/promo/effective price of a product's first item."""
+    try:
+        it = (p.get("items") or [{}])[0]
+        pr = (it or {}).get("price") or {}
+    except Exception:
+        pr = {}
+    reg = pr.get("regular") if isinstance(pr.get("regular"), (int, float)) else None
+    promo = pr.get("promo") if isinstance(pr.get("promo"), (int, float)) and pr.get("promo") > 0 else None
+    price = promo if promo is not None and (reg is None or promo < reg) else reg
+    return {"regular": reg, "promo": promo, "price": price}
+
+
+def _cache_key_product(location_id: str, product_id: str) -> str:
+    return f"product::{location_id}::{product_id}"
+
+
+async def _products_for_term(settings: Settings, term: str, location_id: str, cap: int) -> list[dict]:
+    """Aggregated term results for a location, served from products_cache when warm."""
+    cache_key = _cache_key_products(location_id, term, cap)
+    cached = await _get_cached(cache_key)
+    if cached and cached.get("expires_at") and cached["expires_at"] > datetime.now():
+        return cached["items"]
+    items, complete = await _aggregate_products(settings, term, location_id, cap)
+    if complete:
+        await _cache_products(cache_key, items)
+    return items
+
+
+async def _products_by_id(settings: Settings, product_ids: list[str], location_id: str) -> Dict[str, dict]:
+    """
+    Look up products by ID at a location, caching each product individually.
+    Missing IDs are fetched in batches of 50 (the Products API filter limit).
+    """
+    now = datetime.now()
+    found: Dict[str, dict] = {}
+    missing: list[str] = []
+    unique_ids = list(dict.fromkeys(product_ids))
+    entries = await store.products_cache.get_many([_cache_key_product(location_id, pid) for pid in unique_ids])
+    for pid, cached in zip(unique_ids, entries):
+        if cached is None and snapshots.index:
+            cached = await snapshots.restore(_cache_key_product(location_id, pid))
+        if cached and cached.get("expires_at") and cached["expires_at"] > now:
+            if cached["items"]:
+                found[pid] = cached["items"][0]
+        else:
+            missing.append(pid)
+    if not missing:
+        return found
+
+    fetched: list[dict] = []
+    if settings.DEV_MODE:
+        wanted = set(missing)
+        fetched = [p for p in _sample_products("") if p.get("productId") in wanted]
+    else:
+        token = await get_token(settings)
+        headers = {"Authorization": f"Bearer {token}"}
+        async with upstream.session(timeout=15) as client:
+            for i in range(0, len(missing), 50):
+                chunk = missing[i : i + 50]
+                params = {
+                    "filter.productId": ",".join(chunk),
+                    "filter.locationId": location_id,
+                    "filter.limit": len(chunk),
+                }
+                resp = await client.get(f"{settings.KROGER_API_BASE_URL}/products", headers=headers, params=params)
+                if resp.status_code != 200:
+                    logger.error(f"Products by id error: {resp.status_code} - {resp.text}")
+                    raise HTTPException(status_code=resp.status_code, detail=resp.text)
+                fetched.extend(resp.json().get("data", []))
+
+    await _ingest(location_id, fetched)
+    by_id = {p.get("productId"): p for p in fetched if p.get("productId")}
+    for pid in missing:
+        # Cache misses too so unavailable products don't trigger a lookup every time
+        p = by_id.get(pid)
+        await _cache_products(_cache_key_product(location_id, pid), [p] if p else [])
+        if p:
+            found[pid] = p
+    return found
+
+
+@app.get("/api/products/compare")
+async def products_compare(
+    locationIds: str = Query(..., description="Comma-separated Kroger location IDs"),
+    term: Optional[str] = Query(None, description="Search term to compare"),
+    productIds: Optional[str] = Query(None, description="Comma-separated product IDs to compare"),
+    max_items: int = Query(50, alias="max", description="Max items aggregated per store for a term (cap 400)"),
+    limit: int = Query(50, description="Max products in the matrix"),
+):
+    """
+    Compare prices for a term (or specific products) across several stores.
+    Stores are queried concurrently (bounded) through the product caches and results are
+    joined by productId/upc into a per-product price matrix with the cheapest store marked.
+    """
+    settings = get_settings()
+    locations = list(dict.fromkeys(x.strip() for x in locationIds.split(",") if x.strip()))
+    ids = [x.strip() for x in (productIds or "").split(",") if x.strip()]
+    if not locations:
+        raise HTTPException(status_code=400, detail="At least one locationId is required")
+    if len(locations) > 20:
+        raise HTTPException(status_code=400, detail="At most 20 locations can be compared")
+    if not term and not ids:
+        raise HTTPException(status_code=400, detail="Either term or productIds is required")
+    cap = min(max_items if max_items > 0 else 50, 400)
+
+    semaphore = asyncio.Semaphore(settings.COMPARE_CONCURRENCY)
+
+    async def fetch_location(location_id: str) -> list[dict]:
+        async with semaphore:
+            if ids:
+                return list((await _products_by_id(settings, ids, location_id)).values())
+            return await _products_for_term(settings, term, location_id, cap)
+
+    results = await asyncio.gather(*[fetch_location(loc) for loc in locations], return_exceptions=True)
+
+    rows: Dict[str, Dict[str, Any]] = {}
+    errors: Dict[str, str] = {}
+    for location_id, batch in zip(locations, results):
+        if isinstance(batch, Exception):
+            logger.warning(f"Compare failed for {location_id}: {batch}")
+            errors[location_id] = getattr(batch, "detail", None) or str(batch)
+            _mark_partial()
+            continue
+        for p in batch:
+            key = p.get("productId") or p.get("upc")
+            if not key:
+                continue
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {
+                    "productId": p.get("productId"),
+                    "upc": p.get("upc"),
+                    "description": p.get("description"),
+                    "brand": p.get("brand"),
+                    "prices": {},
+                }
+            info = _price_info(p)
+            if info["price"] is not None:
+                row["prices"][location_id] = info
+
+    products = []
+    for row in rows.values():
+        prices = row["prices"]
+        if not prices:
+            continue
+        # Ties go to the store listed first in the request
+        cheapest = min(locations, key=lambda loc: prices[loc]["price"] if loc in prices else float("inf"))
+        row["cheapestLocationId"] = cheapest
+        row["cheapestPrice"] = prices[cheapest]["price"]
+        highest = max(v["price"] for v in prices.values())
+        row["savings"] = round(highest - row["cheapestPrice"], 2)
+        row["storeCount"] = len(prices)
+        products.append(row)
+    # Products carried by more stores are the most useful comparisons
+    products.sort(key=lambda r: (-r["storeCount"], -r["savings"], r["cheapestPrice"]))
+    products = products[: min(limit if limit > 0 else 50, 400)]
+
+    cheapest_counts = {loc: 0 for loc in locations}
+    for row in products:
+        cheapest_counts[row["cheapestLocationId"]] += 1
+    return {
+        "term": term,
+        "locations": locations,
+        "products": products,
+        "cheapestCounts": cheapest_counts,
+        "errors": errors,
+        "partial": _is_partial(),
+    }
+
+
+# Product ingestion: unit prices and price history
+_SIZE_RE = re.compile(r"(\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)\s*(fl\.?\s*oz|oz|ounces?|lbs?|pounds?|kg|g|grams?|ml|l|liters?|litres?|gal(?:lons?)?|qt|quarts?|pt|pints?)(?![a-z])", re.I)
+_PACK_RE = re.compile(r"(\d+)\s*(?:-\s*)?(pk|pack|ct|count|cans|bottles)(?![a-z])|(\d+)\s*x(?![a-z])", re.I)
+# Weight and volume both normalize to ounces, as shelf tags do ("64 oz" milk is sold by fluid ounce)
+_OUNCES_PER_UNIT = {
+    "oz": 1.0, "ounce": 1.0, "ounces": 1.0, "floz": 1.0, "fl.oz": 1.0,
+    "lb": 16.0, "lbs": 16.0, "pound": 16.0, "pounds": 16.0,
+    "g": 1 / 28.3495, "gram": 1 / 28.3495, "grams": 1 / 28.3495, "kg": 1000 / 28.3495,
+    "ml": 1 / 29.5735, "l": 1000 / 29.5735, "liter": 1000 / 29.5735, "liters": 1000 / 29.5735,
+    "litre": 1000 / 29.5735, "litres": 1000 / 29.5735,
+    "gal": 128.0, "gallon": 128.0, "gallons": 128.0, "qt": 32.0, "quart": 32.0, "quarts": 32.0,
+    "pt": 16.0, "pint": 16.0, "pints": 16.0,
+}
+# Units that size one can or bottle, so "12 ct 12 fl oz" is twelve of them
+_LIQUID_UNITS = {"floz", "fl.oz", "ml", "l", "liter", "liters", "litre", "litres"}
+
+
+def _size_amount(amount: str) -> float:
+    """"64", "2.5", "1/2" or "1 1/2" as a number."""
+    total = 0.0
+    for part in amount.split():
+        numerator, _, denominator = part.partition("/")
+        total += float(numerator) / float(denominator) if denominator else float(numerator)
+    return total
+
+
+def _parse_size(description: str) -> Optional[tuple[float, str]]:
+    """
+    Total package size from a description as (amount, "oz") or (count, "ct"),
+    e.g. "Milk 64 oz" -> (64, "oz"), "Milk 1/2 gal" -> (64, "oz"),
+    "Coca-Cola 12pk 12 fl oz Cans" and "Coca-Cola 12 ct / 12 fl oz" -> (144, "oz"),
+    "Tide Pods 42 ct 2.3 lb" -> (36.8, "oz").
+    """
+    text = description or ""
+    size = _SIZE_RE.search(text)
+    packs = list(_PACK_RE.finditer(text))
+    count = int(packs[0].group(1) or packs[0].group(3)) if packs else None
+    if size:
+        unit = re.sub(r"\s+", "", size.group(2).lower())
+        try:
+            ounces = _size_amount(size.group(1)) * _OUNCES_PER_UNIT.get(unit, 1.0)
+        except ZeroDivisionError:
+            return None
+        multipack = next((m for m in packs if (m.group(2) or "x").lower() not in ("ct", "count")), None)
+        counted = next((m for m in packs if (m.group(2) or "").lower() in ("ct", "count") and m.end() <= size.start()), None)
+        if multipack and multipack.start() != size.start():
+            ounces *= int(multipack.group(1) or multipack.group(3))
+        elif counted and (unit in _LIQUID_UNITS or re.fullmatch(r"\s*/\s*", text[counted.end() : size.start()])):
+            # "12 ct 12 fl oz" and "12 ct / 12 oz" size each unit; a weight next to "42 ct" is the whole package
+            ounces *= int(counted.group(1))
+        return (round(ounces, 3), "oz") if ounces > 0 else None
+    if count:
+        return float(count), "ct"
+    return None
+
+
+def _product_size(p: dict) -> Optional[tuple[float, str]]:
+    """Package size from the description, else from the first item's `size` (e.g. "12 ct / 12 fl oz")."""
+    size = _parse_size(p.get("description") or "")
+    items = p.get("items") or []
+    if size is None and items and isinstance(items[0], dict):
+        size = _parse_size(str(items[0].get("size") or ""))
+    return size
+
+
+def _annotate_unit_price(p: dict) -> None:
+    """Store the parsed package size and price per unit on a product (once per product)."""
+    if "unitPrice" in p:
+        return
+    size = _product_size(p)
+    price = _price_info(p)["price"]
+    if size and price is not None:
+        p["size"] = {"amount": size[0], "unit": size[1]}
+        p["unitPrice"] = round(price / size[0], 4)
+        p["unitPriceUnit"] = size[1]
+    else:
+        p["unitPrice"] = None
+        p["unitPriceUnit"] = None
+
+
+async def _ingest(location_id: str, products: list[dict]) -> None:
+    """Enrich products fresh from upstream before they are cached or returned."""
+    for p in products:
+        _annotate_unit_price(p)
+    await price_history.observe(location_id, products)
+
+
+def _apply_unit_filters(
+    items: list[dict],
+    sortBy: Optional[str],
+    unit: Optional[str],
+    minUnitPrice: Optional[float],
+    maxUnitPrice: Optional[float],
+) -> list[dict]:
+    """Filter and sort on the precomputed unitPrice/unitPriceUnit fields."""
+    out = items
+    if unit:
+        out = [p for p in out if p.get("unitPriceUnit") == unit]
+    if minUnitPrice is not None:
+        out = [p for p in out if p.get("unitPrice") is not None and p["unitPrice"] >= minUnitPrice]
+    if maxUnitPrice is not None:
+        out = [p for p in out if p.get("unitPrice") is not None and p["unitPrice"] <= maxUnitPrice]
+    if sortBy == "unitPrice":
+        # Products without a parsable size sort last
+        out = sorted(out, key=lambda p: (p.get("unitPrice") is None, p.get("unitPrice") or 0))
+    elif sortBy == "price":
+        out = sorted(out, key=lambda p: (_price_info(p)["price"] is None, _price_info(p)["price"] or 0))
+    return out
+
+
+# Price history and deal detection
+class PriceSeries:
+    """
+    Observed prices for one product at one location, with running aggregates.
+    The average weights each price by how long it held, so a one-day promo
+    counts for a day, not as much as a price that held for months.
+    """
+
+    __slots__ = ("times", "regular", "promo", "count", "weighted", "duration", "low", "low_at", "high")
+
+    def __init__(self):
+        self.times = array("d")
+        self.regular = array("f")
+        self.promo = array("f")
+        self.count = 0
+        # Sum of price * seconds held, and seconds covered, over intervals closed by a later change
+        self.weighted = 0.0
+        self.duration = 0.0
+        self.low = float("inf")
+        self.low_at = 0.0
+        self.high = 0.0
+
+    @staticmethod
+    def effective(regular: float, promo: float) -> float:
+        if not math.isnan(promo) and (math.isnan(regular) or promo < regular):
+            return promo
+        return regular
+
+    def append(self, t: float, regular: float, promo: float) -> bool:
+        """Add an observation unless the prices are unchanged since the last one."""
+        if self.times and _same_price(self.regular[-1], regular) and _same_price(self.promo[-1], promo):
+            return False
+        if self.times:
+            previous = self.current()
+            if not math.isnan(previous):
+                held = max(t - self.times[-1], 0.0)
+                self.weighted += previous * held
+                self.duration += held
+        self.times.append(t)
+        self.regular.append(regular)
+        self.promo.append(promo)
+        # Aggregate the stored (float32) values so they compare exactly with current()
+        price = self.current()
+        if not math.isnan(price):
+            self.count += 1
+            if price < self.low:
+                self.low, self.low_at = price, t
+            self.high = max(self.high, price)
+        return True
+
+    def current(self) -> float:
+        return self.effective(self.regular[-1], self.promo[-1])
+
+    def average(self, now: float) -> float:
+        """Time-weighted average price from the first observation until `now`."""
+        weighted, duration = self.weighted, self.duration
+        price = self.current()
+        if not math.isnan(price):
+            held = max(now - self.times[-1], 0.0)
+            weighted += price * held
+            duration += held
+        if duration <= 0:
+            return price
+        return weighted / duration
+
+
+def _same_price(a: float, b: float) -> bool:
+    return (math.isnan(a) and math.isnan(b)) or round(a, 2) == round(b, 2)
+
+
+def _money(v: float) -> Optional[float]:
+    return None if math.isnan(v) or math.isinf(v) else round(v, 2)
+
+
+class PriceHistory:
+    """
+    Append-only price time series per (locationId, productId).
+
+    Each change is one fixed-size binary record (timestamp, productId, locationId,
+    regular, promo). Unchanged prices are not recorded. Lows, highs and averages are
+    maintained as records are replayed, so history and deal queries never rescan the points.
+
+    With Redis the log is one append-only Redis string shared by every worker: the last
+    price per product is swapped in with SET ... GET, so exactly one worker records each
+    change, and each worker replays records it hasn't seen before answering a query.
+    Without Redis the log is PRICE_HISTORY_PATH, appended to by the one process holding
+    its file lock.
+    """
+
+    RECORD = struct.Struct("<d16s12sff")
+    LOG_KEY = "kroger:price_history"
+    LAST_PREFIX = "kroger:price_last:"
+    DESCRIPTIONS_KEY = "kroger:price_descriptions"
+
+    def __init__(self):
+        self.series: Dict[tuple[str, str], PriceSeries] = {}
+        self.by_location: Dict[str, Dict[str, PriceSeries]] = {}
+        self.descriptions: Dict[str, str] = {}
+        self.file = None
+        self.redis: Any = None
+        self.offset = 0
+        self.sync_lock = asyncio.Lock()
+
+    def _series(self, location_id: str, product_id: str) -> PriceSeries:
+        key = (location_id, product_id)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = PriceSeries()
+            self.by_location.setdefault(location_id, {})[product_id] = series
+        return series
+
+    def _replay(self, data: bytes) -> int:
+        """Apply whole records from `data`; returns the number of bytes consumed."""
+        # Ignore a torn trailing record from an interrupted write
+        usable = len(data) - len(data) % self.RECORD.size
+        for t, pid, loc, regular, promo in self.RECORD.iter_unpack(memoryview(data)[:usable]):
+            self._series(loc.rstrip(b"\0").decode(), pid.rstrip(b"\0").decode()).append(t, regular, promo)
+        return usable
+
+    async def start(self, settings: Settings) -> int:
+        """Load recorded history; returns the number of records replayed."""
+        if isinstance(store, RedisStore):
+            self.redis = store.raw_client
+            await self.sync()
+            return self.offset // self.RECORD.size
+        if settings.PRICE_HISTORY_PATH:
+            return self.load(settings.PRICE_HISTORY_PATH)
+        return 0
+
+    def load(self, path: str) -> int:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        count = self._replay(data) // self.RECORD.size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "ab")
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # Another process records to this file; set REDIS_URL to share history between workers
+            logger.warning(f"{path} is locked by another process; not recording price history here")
+            self.file.close()
+            self.file = None
+        return count
+
+    async def sync(self) -> None:
+        """Replay records appended to the shared log by any worker since the last sync."""
+        if self.redis is None:
+            return
+        async with self.sync_lock:
+            data = await self.redis.getrange(self.LOG_KEY, self.offset, -1)
+            self.offset += self._replay(data)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.redis = None
+
+    async def observe(self, location_id: str, products: list[dict]) -> None:
+        """Record the prices in an upstream response."""
+        if not location_id or len(location_id) > 12:
+            return
+        now = datetime.now().timestamp()
+        observed: list[tuple[str, float, float]] = []
+        descriptions: Dict[str, str] = {}
+        for p in products:
+            pid = p.get("productId")
+            if not pid or len(pid) > 16:
+                continue
+            info = _price_info(p)
+            if info["price"] is None:
+                continue
+            if p.get("description"):
+                descriptions[pid] = p["description"]
+            regular = info["regular"] if info["regular"] is not None else math.nan
+            promo = info["promo"] if info["promo"] is not None else math.nan
+            observed.append((pid, regular, promo))
+        self.descriptions.update(descriptions)
+        records = bytearray()
+        if self.redis is None:
+            for pid, regular, promo in observed:
+                if self._series(location_id, pid).append(now, regular, promo):
+                    records += self.RECORD.pack(now, pid.encode(), location_id.encode(), regular, promo)
+            if records and self.file is not None:
+                self.file.write(records)
+                self.file.flush()
+            return
+        if not observed:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for pid, regular, promo in observed:
+                # Price last seen for this product; refreshed on every sighting
+                pipe.set(f"{self.LAST_PREFIX}{location_id}:{pid}", f"{regular:.2f}|{promo:.2f}", get=True, ex=30 * 24 * 3600)
+            if descriptions:
+                pipe.hset(self.DESCRIPTIONS_KEY, mapping=descriptions)
+            previous = await pipe.execute()
+        for (pid, regular, promo), prev in zip(observed, previous):
+            if prev is None or prev.decode() != f"{regular:.2f}|{promo:.2f}":
+                records += self.RECORD.pack(now, pid.encode(), location_id.encode(), regular, promo)
+        if records:
+            await self.redis.append(self.LOG_KEY, bytes(records))
+
+    async def describe(self, product_ids: list[str]) -> Dict[str, Optional[str]]:
+        """Latest description for each product, from any worker."""
+        if self.redis is None or not product_ids:
+            return {pid: self.descriptions.get(pid) for pid in product_ids}
+        values = await self.redis.hmget(self.DESCRIPTIONS_KEY, product_ids)
+        return {pid: v.decode() if v is not None else None for pid, v in zip(product_ids, values)}
+
+    def summary(self, location_id: str, product_id: str, series: PriceSeries, description: Optional[str]) -> Dict[str, Any]:
+        average = series.average(datetime.now().timestamp()) if series.count else math.nan
+        return {
+            "productId": product_id,
+            "locationId": location_id,
+            "description": description,
+            "current": _money(series.current()),
+            "allTimeLow": _money(series.low),
+            "allTimeLowAt": datetime.fromtimestamp(series.low_at) if series.count else None,
+            "allTimeHigh": _money(series.high) if series.count else None,
+            "average": _money(average),
+            "observations": len(series.times),
+        }
+
+
+price_history = PriceHistory()
+
+
+@app.get("/api/prices/history")
+async def prices_history(
+    productId: str = Query(..., description="Product ID"),
+    locationId: str = Query(..., description="Kroger location ID"),
+):
+    """Recorded price changes for a product at a location, with low/high/average."""
+    await price_history.sync()
+    series = price_history.series.get((locationId, productId))
+    if series is None:
+        raise HTTPException(status_code=404, detail="No price history for this product")
+    points = [
+        {
+            "at": datetime.fromtimestamp(t),
+            "regular": _money(r),
+            "promo": _money(pr),
+            "price": _money(PriceSeries.effective(r, pr)),
+        }
+        for t, r, pr in zip(series.times, series.regular, series.promo)
+    ]
+    descriptions = await price_history.describe([productId])
+    return {**price_history.summary(locationId, productId, series, descriptions[productId]), "points": points}
+
+
+@app.get("/api/prices/lows")
+async def prices_lows(
+    locationId: str = Query(..., description="Kroger location ID"),
+    productIds: Optional[str] = Query(None, description="Comma-separated product IDs (default: all tracked)"),
+    limit: int = Query(100, description="Maximum number of results"),
+):
+    """All-time low prices for tracked products, flagging those currently at their low."""
+    await price_history.sync()
+    tracked = price_history.by_location.get(locationId, {})
+    ids = [x.strip() for x in productIds.split(",") if x.strip()] if productIds else list(tracked)
+    ids = [pid for pid in ids if pid in tracked and tracked[pid].count][: min(max(limit, 1), 1000)]
+    descriptions = await price_history.describe(ids)
+    out = []
+    for pid in ids:
+        series = tracked[pid]
+        row = price_history.summary(locationId, pid, series, descriptions[pid])
+        row["atLow"] = _same_price(series.current(), series.low)
+        out.append(row)
+    return out
+
+
+@app.get("/api/prices/deals")
+async def prices_deals(
+    locationId: str = Query(..., description="Kroger location ID"),
+    minDiscount: float = Query(0.1, description="Minimum fraction below the average observed price"),
+    minObservations: int = Query(2, description="Ignore products with fewer recorded price changes"),
+    limit: int = Query(50, description="Maximum number of results"),
+):
+    """
+    "Real" deals: products whose current price is at (or within a cent of) their all-time low
+    and at least `minDiscount` below their time-weighted average price. A promo against an
+    inflated regular price doesn't qualify because it is compared to history, not to `regular`.
+    """
+    await price_history.sync()
+    now = datetime.now().timestamp()
+    deals = []
+    for pid, series in price_history.by_location.get(locationId, {}).items():
+        if series.count < minObservations:
+            continue
+        current = series.current()
+        average = series.average(now)
+        if math.isnan(current) or average <= 0:
+            continue
+        discount = 1 - current / average
+        if discount >= minDiscount and current <= series.low + 0.01:
+            row = price_history.summary(locationId, pid, series, None)
+            row["discount"] = round(discount, 3)
+            deals.append(row)
+    deals.sort(key=lambda r: r["discount"], reverse=True)
+    deals = deals[: min(max(limit, 1), 500)]
+    descriptions = await price_history.describe([row["productId"] for row in deals])
+    for row in deals:
+        row["description"] = descriptions[row["productId"]]
+    return deals
+
+
+# Change feed: push cart and list changes to connected clients
+class _Subscriber:
+    __slots__ = ("channels", "queue")
+
+    def __init__(self, channels: set[str], size: int):
+        self.channels = channels
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=size)
+
+
+class ChangeFeed:
+    """
+    Versioned cart/list change events fanned out to WebSocket and SSE subscribers.
+
+    Every mutation gets the next global version and is encoded to JSON once; delivery
+    is a non-blocking put into each subscriber's bounded queue, so one slow client
+    never holds up the others. A client that falls behind gets a single "resync"
+    event (re-fetch, then continue) instead of an ever-growing backlog. With Redis,
+    events go through pub/sub so clients on every worker see every change.
+    """
+
+    CHANNEL = "kroger:changes"
+
+    def __init__(self):
+        self.subscribers: set[_Subscriber] = set()
+        self.recent: deque[tuple[int, str, str]] = deque(maxlen=500)
+        self.version = 0
+        self.listener: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, change: Dict[str, Any]) -> None:
+        version = await store.next_change_version()
+        message = json.dumps({"channel": channel, "version": version, **change}, default=_json_default)
+        if isinstance(store, RedisStore):
+            await store.client.publish(self.CHANNEL, message)
+        else:
+            self._deliver(version, channel, message)
+
+    def _deliver(self, version: int, channel: str, message: str) -> None:
+        self.version = max(self.version, version)
+        self.recent.append((version, channel, message))
+        for sub in self.subscribers:
+            if channel not in sub.channels:
+                continue
+            try:
+                sub.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._resync(sub)
+
+    def _resync(self, sub: _Subscriber) -> None:
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(json.dumps({"op": "resync", "version": self.version}))
+
+    def subscribe(self, channels: set[str], since: Optional[int]) -> _Subscriber:
+        sub = _Subscriber(channels, get_settings().CHANGE_QUEUE_SIZE)
+        if since is not None and since > self.version:
+            # A version we never issued (the server restarted, or this worker joined late): history is unknown
+            self._resync(sub)
+        elif since is not None and since < self.version:
+            missed = [(v, c, m) for v, c, m in self.recent if v > since and c in channels]
+            oldest = self.recent[0][0] if self.recent else self.version + 1
+            if oldest > since + 1 or len(missed) >= sub.queue.maxsize:
+                self._resync(sub)
+            else:
+                for _, _, message in missed:
+                    sub.queue.put_nowait(message)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        self.subscribers.discard(sub)
+
+    async def _listen(self, url: str) -> None:
+        import redis.asyncio as aioredis
+
+        while True:
+            client = aioredis.from_url(url, decode_responses=True)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    event = json.loads(message["data"])
+                    self._deliver(event["version"], event["channel"], message["data"])
+            except Exception as e:
+                # Anything published while disconnected is lost, so tell everyone to resync
+                logger.warning(f"Change feed listener error: {e}")
+                for sub in self.subscribers:
+                    self._resync(sub)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+    def start(self, settings: Settings) -> None:
+        if settings.REDIS_URL and self.listener is None:
+            self.listener = asyncio.create_task(self._listen(settings.REDIS_URL))
+
+    async def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
+
+
+changes = ChangeFeed()
+
+
+def _feed_channels(channels: str) -> set[str]:
+    return {c.strip() for c in channels.split(",") if c.strip() in {"cart", "lists"}} or {"cart", "lists"}
+
+
+@app.websocket("/ws/changes")
+async def changes_websocket(websocket: WebSocket, channels: str = "cart,lists", since: Optional[int] = None):
+    """Push cart/list change events as JSON text frames; `since` replays missed versions."""
+    await websocket.accept()
+    sub = changes.subscribe(_feed_channels(channels), since)
+
+    async def send():
+        while True:
+            await websocket.send_text(await sub.queue.get())
+
+    async def receive():
+        # Clients don't send anything; this only notices disconnects while idle
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        changes.unsubscribe(sub)
+
+
+@app.get("/api/changes/stream")
+async def changes_stream(
+    request: Request,
+    channels: str = Query("cart,lists", description="Comma-separated channels: cart, lists"),
+    since: Optional[int] = Query(None, description="Replay changes after this version"),
+):
+    """Server-Sent Events version of /ws/changes; honours Last-Event-ID on reconnect."""
+    last_event_id = request.headers.get("Last-Event-ID")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    sub = changes.subscribe(_feed_channels(channels), since)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(sub.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                version = json.loads(message).get("version")
+                yield f"id: {version}\ndata: {message}\n\n"
+        finally:
+            changes.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 # Shopping Lists API endpoints
@@ -482,32 +2278,33 @@ async def create_shopping_list(request: CreateListRequest):
         createdAt=datetime.now(),
         updatedAt=datetime.now()
     )
-    store.lists[list_id] = new_list
+    await store.lists.set(list_id, new_list)
+    await changes.publish("lists", {"op": "upsert", "list": new_list.model_dump(mode="json")})
     return new_list
 
 
 @app.get("/api/lists", response_model=List[ShoppingList])
 async def get_shopping_lists():
     """Get all shopping lists"""
-    return list(store.lists.values())
+    return await store.lists.values()
 
 
 @app.get("/api/lists/{list_id}", response_model=ShoppingList)
 async def get_shopping_list(list_id: str):
     """Get a specific shopping list"""
-    if list_id not in store.lists:
+    shopping_list = await store.lists.get(list_id)
+    if shopping_list is None:
         raise HTTPException(status_code=404, detail="Shopping list not found")
-    return store.lists[list_id]
+    return shopping_list
 
 
 @app.put("/api/lists/{list_id}", response_model=ShoppingList)
 async def update_shopping_list(list_id: str, request: UpdateListRequest):
     """Update a shopping list"""
-    if list_id not in store.lists:
+    shopping_list = await store.lists.get(list_id)
+    if shopping_list is None:
         raise HTTPException(status_code=404, detail="Shopping list not found")
     
-    shopping_list = store.lists[list_id]
-    
     if request.name is not None:
         shopping_list.name = request.name
     
@@ -515,39 +2312,406 @@ async def update_shopping_list(list_id: str, request: UpdateListRequest):
         shopping_list.items = request.items
     
     shopping_list.updatedAt = datetime.now()
+    await store.lists.set(list_id, shopping_list)
+    # Only the fields that were sent
+    changed = shopping_list.model_dump(mode="json", include={"name", "items", "updatedAt"} & (request.model_fields_set | {"updatedAt"}))
+    await changes.publish("lists", {"op": "update", "id": list_id, "changes": changed})
     return shopping_list
 
 
 @app.delete("/api/lists/{list_id}")
 async def delete_shopping_list(list_id: str):
     """Delete a shopping list"""
-    if list_id not in store.lists:
+    if not await store.lists.delete(list_id):
         raise HTTPException(status_code=404, detail="Shopping list not found")
     
-    del store.lists[list_id]
+    await changes.publish("lists", {"op": "delete", "id": list_id})
     return {"message": "Shopping list deleted successfully"}
 
 
-# Cart API endpoints
-def _serialize_cart() -> Dict[str, Any]:
-    items = []
-    for item in store.cart.values():
-        items.append({
-            "id": item.productId,
+# Largest number of store sets the basket optimizer enumerates exactly (20 stores, up to 4 per plan)
+_BASKET_EXACT_LIMIT = 10000
+
+
+def _basket_cost(prices: list[float], quantities: list[int]) -> tuple[int, float]:
+    """(missing item count, total) for per-item unit prices; inf marks an unavailable item."""
+    missing = 0
+    total = 0.0
+    for price, qty in zip(prices, quantities):
+        if price == math.inf:
+            missing += 1
+        else:
+            total += price * qty
+    return missing, round(total, 2)
+
+
+def _optimize_basket(matrix: list[list[float]], quantities: list[int], max_stores: int) -> tuple[list[int], tuple[int, float]]:
+    """
+    Pick up to `max_stores` stores minimising (missing items, total) when each item is
+    bought wherever it is cheapest among the chosen stores.
+
+    `matrix[s][i]` is the unit price of item i at store s (inf when unavailable). Store sets
+    are enumerated depth-first carrying the element-wise minimum of the prices so far, so
+    each set costs one vector min. Sets that can't beat the best found even with every
+    remaining store are skipped. Above _BASKET_EXACT_LIMIT sets, stores are added greedily instead.
+    """
+    n = len(matrix)
+    k = min(max_stores, n)
+    if n == 0 or k <= 0:
+        return [], (len(quantities), 0.0)
+    best_sets: list[int] = []
+    best = (len(quantities) + 1, math.inf)
+
+    if sum(math.comb(n, j) for j in range(1, k + 1)) <= _BASKET_EXACT_LIMIT:
+        # Cheapest achievable price per item using stores index >= s (bound for pruning)
+        suffix_min = [[math.inf] * len(quantities) for _ in range(n + 1)]
+        for s in range(n - 1, -1, -1):
+            suffix_min[s] = list(map(min, matrix[s], suffix_min[s + 1]))
+
+        def search(start: int, chosen: list[int], current: Optional[list[float]]):
+            nonlocal best, best_sets
+            for s in range(start, n):
+                mins = matrix[s] if current is None else list(map(min, current, matrix[s]))
+                cost = _basket_cost(mins, quantities)
+                if cost < best:
+                    best, best_sets = cost, chosen + [s]
+                if len(chosen) + 1 < k and s + 1 < n:
+                    bound = _basket_cost(list(map(min, mins, suffix_min[s + 1])), quantities)
+                    if bound < best:
+                        search(s + 1, chosen + [s], mins)
+
+        search(0, [], None)
+        return best_sets, best
+
+    current: Optional[list[float]] = None
+    remaining = set(range(n))
+    while remaining and len(best_sets) < k:
+        step = min(
+            remaining,
+            key=lambda s: _basket_cost(matrix[s] if current is None else list(map(min, current, matrix[s])), quantities),
+        )
+        mins = matrix[step] if current is None else list(map(min, current, matrix[step]))
+        cost = _basket_cost(mins, quantities)
+        if best_sets and cost >= best:
+            break
+        best, current = cost, mins
+        best_sets.append(step)
+        remaining.discard(step)
+    return best_sets, best
+
+
+def _is_available(p: dict) -> bool:
+    it = (p.get("items") or [{}])[0] or {}
+    stock = ((it.get("inventory") or {}).get("stockLevel") or "").upper()
+    return stock != "TEMPORARILY_OUT_OF_STOCK"
+
+
+@app.get("/api/lists/{list_id}/optimize")
+async def optimize_shopping_list(
+    list_id: str,
+    locationIds: str = Query(..., description="Comma-separated candidate Kroger location IDs"),
+    maxStores: int = Query(2, description="Maximum number of stores in the split plan (cap 5)"),
+):
+    """
+    Find the cheapest store for a whole shopping list, and the cheapest split across
+    up to `maxStores` stores. Current prices and availability come from cached, batched
+    product lookups at each candidate store.
+    """
+    shopping_list = await store.lists.get(list_id)
+    if shopping_list is None:
+        raise HTTPException(status_code=404, detail="Shopping list not found")
+    settings = get_settings()
+    locations = list(dict.fromkeys(x.strip() for x in locationIds.split(",") if x.strip()))
+    if not locations:
+        raise HTTPException(status_code=400, detail="At least one locationId is required")
+    if len(locations) > 20:
+        raise HTTPException(status_code=400, detail="At most 20 locations can be compared")
+
+    # Merge duplicate list entries so each product is priced once
+    quantities_by_id: Dict[str, int] = {}
+    descriptions: Dict[str, str] = {}
+    for item in shopping_list.items:
+        quantities_by_id[item.productId] = quantities_by_id.get(item.productId, 0) + max(item.quantity, 1)
+        descriptions.setdefault(item.productId, item.description)
+    product_ids = list(quantities_by_id)
+    quantities = [quantities_by_id[pid] for pid in product_ids]
+
+    semaphore = asyncio.Semaphore(settings.COMPARE_CONCURRENCY)
+
+    async def fetch_location(location_id: str) -> Dict[str, dict]:
+        async with semaphore:
+            return await _products_by_id(settings, product_ids, location_id)
+
+    results = await asyncio.gather(*[fetch_location(loc) for loc in locations], return_exceptions=True)
+
+    matrix: list[list[float]] = []
+    errors: Dict[str, str] = {}
+    for location_id, found in zip(locations, results):
+        if isinstance(found, Exception):
+            logger.warning(f"Optimize lookup failed for {location_id}: {found}")
+            errors[location_id] = getattr(found, "detail", None) or str(found)
+            _mark_partial()
+            found = {}
+        row = []
+        for pid in product_ids:
+            p = found.get(pid)
+            price = _price_info(p)["price"] if p and _is_available(p) else None
+            row.append(math.inf if price is None else price)
+        matrix.append(row)
+
+    def plan(store_indexes: list[int], cost: tuple[int, float]) -> Dict[str, Any]:
+        assignments: Dict[str, list[str]] = {locations[s]: [] for s in store_indexes}
+        missing = []
+        for i, pid in enumerate(product_ids):
+            s = min(store_indexes, key=lambda s: matrix[s][i]) if store_indexes else None
+            if s is None or matrix[s][i] == math.inf:
+                missing.append(pid)
+            else:
+                assignments[locations[s]].append(pid)
+        return {
+            "locationIds": [locations[s] for s in store_indexes],
+            "total": cost[1],
+            "missing": missing,
+            "assignments": assignments,
+        }
+
+    ranking = sorted(
+        (
+            {"locationId": loc, "total": cost[1], "missingCount": cost[0]}
+            for loc, cost in ((loc, _basket_cost(matrix[s], quantities)) for s, loc in enumerate(locations))
+        ),
+        key=lambda r: (r["missingCount"], r["total"]),
+    )
+    single_sets, single_cost = _optimize_basket(matrix, quantities, 1)
+    split_sets, split_cost = _optimize_basket(matrix, quantities, min(max(maxStores, 1), 5))
+    list_total = sum((item.price or 0) * max(item.quantity, 1) for item in shopping_list.items)
+    return {
+        "listId": list_id,
+        "locations": locations,
+        "listTotal": round(list_total, 2),
+        "items": [
+            {
+                "productId": pid,
+                "description": descriptions.get(pid),
+                "quantity": quantities[i],
+                "prices": {loc: matrix[s][i] for s, loc in enumerate(locations) if matrix[s][i] != math.inf},
+            }
+            for i, pid in enumerate(product_ids)
+        ],
+        "singleStore": plan(single_sets, single_cost),
+        "split": plan(split_sets, split_cost),
+        "ranking": ranking,
+        "errors": errors,
+        "partial": _is_partial(),
+    }
+
+
+# Product substitutions
+_STOPWORDS = {"and", "the", "of", "with", "in", "for", "a", "to", "oz", "fl", "lb", "ct", "pk"}
+
+
+def _product_features(p: dict) -> Dict[str, float]:
+    """Raw feature counts for the similarity index: words, brand, categories and size bucket."""
+    desc = (p.get("description") or "").lower()
+    features: Dict[str, float] = {}
+    words = re.findall(r"[a-z][a-z0-9%'-]*|\d+%", _SIZE_RE.sub(" ", desc))
+    for w in words:
+        if w not in _STOPWORDS:
+            features[w] = features.get(w, 0.0) + 1.0
+    if p.get("brand"):
+        # Same brand helps a little; substitutes are often another brand of the same thing
+        features[f"brand:{p['brand'].lower()}"] = 0.5
+    for c in p.get("categories") or []:
+        if isinstance(c, str):
+            features[f"cat:{c.lower()}"] = 1.5
+    size = _product_size(p)
+    if size and size[0] > 0:
+        # Log-scale buckets so 60 oz and 64 oz match but 8 oz and 64 oz don't
+        features[f"size:{size[1]}:{round(math.log2(size[0]))}"] = 1.0
+    return features
+
+
+class SimilarityIndex:
+    """
+    TF-IDF index over the cached catalog for one location.
+
+    Vectors are sparse dicts normalized to unit length and an inverted index maps each
+    feature to (product index, weight), so a query only touches products sharing a
+    feature with it. Queries for a whole list walk the postings once per item.
+    """
+
+    def __init__(self, products: list[dict]):
+        self.products = products
+        raw = [_product_features(p) for p in products]
+        df: Dict[str, int] = {}
+        for feats in raw:
+            for f in feats:
+                df[f] = df.get(f, 0) + 1
+        n = max(len(products), 1)
+        self.idf = {f: math.log((1 + n) / (1 + c)) + 1 for f, c in df.items()}
+        self.position = {p.get("productId"): i for i, p in enumerate(products) if p.get("productId")}
+        self.postings: Dict[str, list[tuple[int, float]]] = {}
+        for i, feats in enumerate(raw):
+            for f, w in self.vector(feats).items():
+                self.postings.setdefault(f, []).append((i, w))
+
+    def vector(self, feats: Dict[str, float]) -> Dict[str, float]:
+        vec = {f: w * self.idf.get(f, 1.0) for f, w in feats.items() if w > 0}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        return {f: w / norm for f, w in vec.items()}
+
+    def similar(self, p: dict, k: int, accept) -> list[tuple[float, dict]]:
+        """Top-k (cosine score, product) pairs among products for which accept(product) is true."""
+        scores: Dict[int, float] = {}
+        for f, w in self.vector(_product_features(p)).items():
+            for i, dw in self.postings.get(f, ()):
+                scores[i] = scores.get(i, 0.0) + w * dw
+        own = self.position.get(p.get("productId"))
+        ranked = heapq.nlargest(k * 4 + 1, scores.items(), key=lambda kv: kv[1])
+        out = []
+        for i, score in ranked:
+            if i == own or score < 0.2:
+                continue
+            if accept(self.products[i]):
+                out.append((round(score, 3), self.products[i]))
+                if len(out) >= k:
+                    break
+        return out
+
+
+_similarity_indexes: Dict[str, tuple[datetime, SimilarityIndex]] = {}
+
+
+async def _similarity_index(location_id: str) -> SimilarityIndex:
+    """Index over the unexpired products cached for a location, rebuilt at most once a minute."""
+    built = _similarity_indexes.get(location_id)
+    now = datetime.now()
+    if built and (now - built[0]).total_seconds() < 60:
+        return built[1]
+    products: Dict[str, dict] = {}
+    for cached in await store.products_cache.get_many(await store.cache_keys(location_id)):
+        # Stale prices shouldn't decide what counts as cheaper
+        if not cached or not cached.get("expires_at") or cached["expires_at"] <= now:
+            continue
+        for p in cached.get("items") or []:
+            pid = p.get("productId")
+            if pid:
+                products[pid] = p
+    index = SimilarityIndex(list(products.values()))
+    _similarity_indexes[location_id] = (now, index)
+    return index
+
+
+def _search_term_for(description: str) -> str:
+    """A short generic term for finding alternatives, e.g. "... Potato Chips 8 oz" -> "potato chips"."""
+    text = _PACK_RE.sub(" ", _SIZE_RE.sub(" ", description.lower()))
+    words = [w for w in re.findall(r"[a-z][a-z'-]+", text) if w not in _STOPWORDS]
+    return " ".join(words[-2:])
+
+
+@app.get("/api/lists/{list_id}/substitutions")
+async def shopping_list_substitutions(
+    list_id: str,
+    locationId: str = Query(..., description="Kroger location ID"),
+    k: int = Query(3, description="Alternatives per item (max 10)"),
+    search: bool = Query(True, description="Search for each item's product type to widen the catalog"),
+):
+    """
+    Suggest cheaper or in-stock alternatives for every item on a list at one store,
+    ranked by similarity (description, brand, category and package size) over the
+    products cached for that store.
+    """
+    shopping_list = await store.lists.get(list_id)
+    if shopping_list is None:
+        raise HTTPException(status_code=404, detail="Shopping list not found")
+    settings = get_settings()
+    k = min(max(k, 1), 10)
+    product_ids = list(dict.fromkeys(item.productId for item in shopping_list.items))
+    current = await _products_by_id(settings, product_ids, locationId)
+
+    if search:
+        terms = {_search_term_for(item.description) for item in shopping_list.items}
+        semaphore = asyncio.Semaphore(settings.COMPARE_CONCURRENCY)
+
+        async def fetch_term(term: str):
+            async with semaphore:
+                return await _products_for_term(settings, term, locationId, 50)
+
+        results = await asyncio.gather(*[fetch_term(t) for t in terms if t], return_exceptions=True)
+        built = _similarity_indexes.get(locationId)
+        for r in results:
+            if isinstance(r, Exception):
+                logger.warning(f"Substitution search failed: {r}")
+            elif built and any(p.get("productId") not in built[1].position for p in r):
+                # The search brought in products the index hasn't seen; rebuild it
+                _similarity_indexes.pop(locationId, None)
+                built = None
+    index = await _similarity_index(locationId)
+
+    out = []
+    for item in shopping_list.items:
+        p = current.get(item.productId)
+        info = _price_info(p) if p else {"price": None}
+        in_stock = bool(p) and _is_available(p) and info["price"] is not None
+        price = info["price"] if in_stock else None
+        query = p or {"productId": item.productId, "description": item.description, "brand": item.brand}
+
+        def accept(alt: dict, price=price) -> bool:
+            alt_price = _price_info(alt)["price"]
+            if alt_price is None or not _is_available(alt):
+                return False
+            return price is None or alt_price < price
+
+        alternatives = []
+        for score, alt in index.similar(query, k, accept):
+            alt_price = _price_info(alt)["price"]
+            alternatives.append({
+                "productId": alt.get("productId"),
+                "description": alt.get("description"),
+                "brand": alt.get("brand"),
+                "price": alt_price,
+                "savings": round(price - alt_price, 2) if price is not None else None,
+                "similarity": score,
+            })
+        out.append({
             "productId": item.productId,
             "description": item.description,
-            "brand": item.brand,
-            "price": item.price,
-            "quantity": item.quantity,
+            "price": price,
+            "reason": "cheaper" if in_stock else ("out_of_stock" if p else "unavailable"),
+            "alternatives": alternatives,
         })
+    return {"listId": list_id, "locationId": locationId, "catalogSize": len(index.products), "items": out}
+
+
+# Cart API endpoints
+def _serialize_cart_item(item: CartItem) -> Dict[str, Any]:
+    return {
+        "id": item.productId,
+        "productId": item.productId,
+        "description": item.description,
+        "brand": item.brand,
+        "price": item.price,
+        "quantity": item.quantity,
+    }
+
+
+async def _serialize_cart() -> Dict[str, Any]:
+    items = [_serialize_cart_item(item) for item in await store.cart.values()]
     total = sum(((i.get("price") or 0) * (i.get("quantity") or 0)) for i in items)
     return {"items": items, "total": round(total, 2)}
 
 
+async def _publish_cart(change: Dict[str, Any]) -> Dict[str, Any]:
+    """Publish a cart change with the new total and return the serialized cart."""
+    data = await _serialize_cart()
+    await changes.publish("cart", {**change, "total": data["total"]})
+    return data
+
+
 @app.get("/api/cart")
 async def get_cart():
     """Get all items in the cart with total"""
-    return _serialize_cart()
+    return await _serialize_cart()
 
 
 @app.post("/api/cart/add")
@@ -562,59 +2726,101 @@ async def add_to_cart(request: AddToCartRequest):
         images=request.images
     )
     
-    # If item already exists, update quantity
-    if request.productId in store.cart:
-        store.cart[request.productId].quantity += request.quantity
-        return _serialize_cart()
-    store.cart[request.productId] = cart_item
-    return _serialize_cart()
+    # If item already exists, update quantity (atomically, so concurrent adds aren't lost)
+    def add(existing: Optional[CartItem]) -> CartItem:
+        if existing is None:
+            return cart_item
+        existing.quantity += request.quantity
+        return existing
+
+    item = await store.cart.modify(request.productId, add)
+    return await _publish_cart({"op": "upsert", "item": _serialize_cart_item(item)})
 
 
 @app.delete("/api/cart/remove/{product_id}")
 async def remove_from_cart(product_id: str):
     """Remove an item from the cart"""
-    if product_id not in store.cart:
+    if not await store.cart.delete(product_id):
         raise HTTPException(status_code=404, detail="Item not found in cart")
     
-    del store.cart[product_id]
-    return _serialize_cart()
+    return await _publish_cart({"op": "remove", "productId": product_id})
 
 
 @app.put("/api/cart/update/{product_id}")
 async def update_cart_item(product_id: str, request: UpdateCartRequest):
     """Update the quantity of an item in the cart"""
-    if product_id not in store.cart:
+    if not await store.cart.contains(product_id):
         raise HTTPException(status_code=404, detail="Item not found in cart")
     
     if request.quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantity must be greater than 0")
     
-    store.cart[product_id].quantity = request.quantity
-    return _serialize_cart()
+    def set_quantity(item: Optional[CartItem]) -> Optional[CartItem]:
+        if item is None:
+            return None
+        item.quantity = request.quantity
+        return item
+
+    # None if the item was removed meanwhile; don't bring it back
+    item = await store.cart.modify(product_id, set_quantity)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found in cart")
+    return await _publish_cart({"op": "upsert", "item": _serialize_cart_item(item)})
 
 
 @app.delete("/api/cart/clear")
 async def clear_cart_delete():
     """Clear all items from the cart"""
-    store.cart.clear()
-    return _serialize_cart()
+    await store.cart.clear()
+    return await _publish_cart({"op": "clear"})
 
 @app.post("/api/cart/clear")
 async def clear_cart_post():
     """Clear all items from the cart (POST compatibility)"""
-    store.cart.clear()
-    return _serialize_cart()
+    await store.cart.clear()
+    return await _publish_cart({"op": "clear"})
 
 
 @app.get("/api/cart/total")
 async def get_cart_total():
     """Calculate the total price and counts"""
-    data = _serialize_cart()
+    data = await _serialize_cart()
     item_count = sum((item.get("quantity") or 0) for item in data["items"]) if data else 0
     return {
         "total": data.get("total", 0),
         "itemCount": item_count,
-        "uniqueItems": len(store.cart)
+        "uniqueItems": len(data["items"])
+    }
+
+
+@app.get("/api/cart/reprice")
+async def reprice_cart(locationId: str = Query(..., description="Kroger location ID")):
+    """Compare the prices stored in the cart with current prices at a location."""
+    settings = get_settings()
+    cart_items = await store.cart.values()
+    current = await _products_by_id(settings, [item.productId for item in cart_items], locationId)
+    items = []
+    cart_total = 0.0
+    current_total = 0.0
+    for item in cart_items:
+        p = current.get(item.productId)
+        price = _price_info(p)["price"] if p else None
+        cart_total += (item.price or 0) * item.quantity
+        current_total += (price if price is not None else item.price or 0) * item.quantity
+        items.append({
+            "productId": item.productId,
+            "description": item.description,
+            "quantity": item.quantity,
+            "cartPrice": item.price,
+            "currentPrice": price,
+            "change": round(price - item.price, 2) if price is not None and item.price is not None else None,
+            "available": bool(p) and _is_available(p),
+        })
+    return {
+        "locationId": locationId,
+        "items": items,
+        "cartTotal": round(cart_total, 2),
+        "currentTotal": round(current_total, 2),
     }
 
 
@@ -638,6 +2844,7 @@ async def product_details(productId: str = Query(...), locationId: str = Query(.
                     }
                 ])
                 p.setdefault("productPageURI", "/p/demo-product")
+                await _ingest(locationId, [p])
                 return p
         raise HTTPException(status_code=404, detail="Product not found")
 
@@ -648,7 +2855,7 @@ async def product_details(productId: str = Query(...), locationId: str = Query(.
         "filter.locationId": locationId,
         "filter.limit": 1,
     }
-    async with httpx.AsyncClient(timeout=15) as client:
+    async with upstream.session(timeout=15) as client:
         resp = await client.get(f"{settings.KROGER_API_BASE_URL}/products", headers=headers, params=params)
         if resp.status_code != 200:
             logger.error(f"Product details error: {resp.status_code} - {resp.text}")
@@ -657,6 +2864,7 @@ async def product_details(productId: str = Query(...), locationId: str = Query(.
         if not data:
             raise HTTPException(status_code=404, detail="Product not found")
         prod = data[0]
+        await _ingest(locationId, [prod])
         # Compute full product page URL if URI is present
         try:
             uri = prod.get("productPageURI") or prod.get("productPageUri")
@@ -667,6 +2875,226 @@ async def product_details(productId: str = Query(...), locationId: str = Query(.
         return prod
 
 
+# Background jobs for heavy aggregations
+class SubmitJobRequest(BaseModel):
+    kind: str
+    params: Dict[str, Any] = {}
+
+
+def _csv(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return ",".join(value) if isinstance(value, list) else str(value)
+
+
+async def _job_sales_all(params: Dict[str, Any]) -> Any:
+    return await products_sales_all(
+        locationId=params["locationId"], max=int(params.get("max", 150)), fresh=False,
+        sortBy=None, unit=None, minUnitPrice=None, maxUnitPrice=None,
+    )
+
+
+async def _job_compare(params: Dict[str, Any]) -> Any:
+    return await products_compare(
+        locationIds=_csv(params["locationIds"]), term=params.get("term"), productIds=_csv(params.get("productIds")),
+        max_items=int(params.get("max", 50)), limit=int(params.get("limit", 50)),
+    )
+
+
+async def _job_optimize_list(params: Dict[str, Any]) -> Any:
+    return await optimize_shopping_list(
+        params["listId"], locationIds=_csv(params["locationIds"]), maxStores=int(params.get("maxStores", 2)),
+    )
+
+
+async def _job_cart_reprice(params: Dict[str, Any]) -> Any:
+    return await reprice_cart(locationId=params["locationId"])
+
+
+# kind -> (handler, required params)
+_JOB_HANDLERS: Dict[str, tuple[Callable[[Dict[str, Any]], Awaitable[Any]], tuple[str, ...]]] = {
+    "sales_all": (_job_sales_all, ("locationId",)),
+    "compare": (_job_compare, ("locationIds",)),
+    "optimize_list": (_job_optimize_list, ("listId", "locationIds")),
+    "cart_reprice": (_job_cart_reprice, ("locationId",)),
+}
+
+
+class JobQueue:
+    """
+    Runs heavy aggregations off the request path with a fixed number of workers per process.
+
+    Jobs are stored in `store.jobs` and queued through the store, so with Redis any worker
+    process can pick them up and any process can answer polls. Submitting a job identical
+    to one that is still queued or running returns the existing job; finished jobs stay
+    pollable by ID, but a fresh submit re-runs against the current cart and list state.
+    """
+
+    def __init__(self):
+        self.tasks: list[asyncio.Task] = []
+        self.wake: Optional[asyncio.Event] = None
+        self.stopping = False
+
+    @staticmethod
+    def dedupe_key(kind: str, params: Dict[str, Any]) -> str:
+        return f"{kind}:{json.dumps(params, sort_keys=True, default=str)}"
+
+    async def submit(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        settings = get_settings()
+        key = self.dedupe_key(kind, params)
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "createdAt": datetime.now(),
+            "startedAt": None,
+            "finishedAt": None,
+            "error": None,
+            "partial": False,
+            "result": None,
+        }
+        # Stored before the key is claimed, so whoever finds the key can load the job
+        await store.jobs.set(job["id"], job)
+        while not await store.job_keys.add(key, job["id"]):
+            # Claimed by an identical submit, possibly on another worker
+            existing_id = await store.job_keys.get(key)
+            existing = await store.jobs.get(existing_id) if existing_id else None
+            if existing and existing["status"] in ("queued", "running"):
+                await store.jobs.delete(job["id"])
+                return existing
+            # The key names a finished or expired job: take it over, unless another submit just did
+            if await store.job_keys.modify(key, lambda current: job["id"] if current == existing_id else None):
+                break
+        await store.enqueue_job(job["id"])
+        if self.wake is not None:
+            self.wake.set()
+        await self._expire(settings)
+        return job
+
+    async def _expire(self, settings: Settings) -> None:
+        # Redis expires entries itself; in memory, drop finished jobs past their TTL
+        if not isinstance(store, RedisStore):
+            cutoff = datetime.now() - timedelta(seconds=settings.JOB_RESULT_TTL_SECONDS)
+            for job_id, job in await store.jobs.items():
+                if job["finishedAt"] and job["finishedAt"] < cutoff:
+                    await store.jobs.delete(job_id)
+                    key = self.dedupe_key(job["kind"], job["params"])
+                    # A resubmitted job may own the key by now
+                    if await store.job_keys.get(key) == job_id:
+                        await store.job_keys.delete(key)
+
+    async def run_job(self, job_id: str, settings: Settings) -> None:
+        job = await store.jobs.get(job_id)
+        if job is None:
+            return
+        handler, _ = _JOB_HANDLERS[job["kind"]]
+        job["status"] = "running"
+        job["startedAt"] = datetime.now()
+        await store.jobs.set(job_id, job)
+        # Jobs run outside any request, so give each one its own deadline and partial flag
+        state = {"deadline": time.monotonic() + settings.JOB_TIMEOUT_SECONDS, "partial": False}
+        token = _request_state.set(state)
+        try:
+            job["result"] = await asyncio.wait_for(handler(job["params"]), timeout=settings.JOB_TIMEOUT_SECONDS)
+            job["status"] = "done"
+        except asyncio.TimeoutError:
+            job["status"], job["error"] = "failed", "Job timed out"
+        except HTTPException as e:
+            job["status"], job["error"] = "failed", str(e.detail)
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({job['kind']}) failed")
+            job["status"], job["error"] = "failed", str(e)
+        except asyncio.CancelledError:
+            # Shutting down mid-job: hand it back to the queue so another worker (or the
+            # next boot) runs it, rather than leaving it "running" until its TTL
+            job["status"], job["startedAt"] = "queued", None
+            await store.jobs.set(job_id, job)
+            await store.enqueue_job(job_id)
+            raise
+        finally:
+            _request_state.reset(token)
+        job["partial"] = state["partial"]
+        job["finishedAt"] = datetime.now()
+        await store.jobs.set(job_id, job)
+
+    async def worker(self) -> None:
+        settings = get_settings()
+        while not self.stopping:
+            job_id = await store.dequeue_job()
+            if job_id is None:
+                self.wake.clear()
+                try:
+                    # Redis-queued jobs from other processes are picked up by polling
+                    await asyncio.wait_for(self.wake.wait(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run_job(job_id, settings)
+
+    def start(self, concurrency: int) -> None:
+        self.wake = asyncio.Event()
+        self.stopping = False
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self.worker()) for _ in range(max(concurrency, 1))]
+
+    async def stop(self, timeout: float = 0) -> None:
+        """Stop taking jobs, give running ones up to `timeout` seconds, then requeue the rest."""
+        self.stopping = True
+        if self.wake is not None:
+            self.wake.set()
+        if self.tasks and timeout > 0:
+            await asyncio.wait(self.tasks, timeout=timeout)
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+
+
+jobs = JobQueue()
+
+
+def _job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in job.items() if k != "result"}
+
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: SubmitJobRequest):
+    """Queue a heavy aggregation and return its job ID immediately."""
+    if request.kind not in _JOB_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind. Expected one of: {', '.join(_JOB_HANDLERS)}")
+    missing = [p for p in _JOB_HANDLERS[request.kind][1] if p not in request.params]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing params: {', '.join(missing)}")
+    return _job_status(await jobs.submit(request.kind, request.params))
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a background job"""
+    job = await store.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_status(job)
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Result of a finished job; 202 with the status while it is still queued or running"""
+    job = await store.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"] or "Job failed")
+    if job["status"] != "done":
+        return JSONResponse(status_code=202, content=jsonable_encoder(_job_status(job)))
+    return job["result"]
+
+
 # --- Sample data helpers for DEV_MODE ---
 def _sample_products(term: str) -> list[dict]:
     term_l = (term or "").lower()
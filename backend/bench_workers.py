@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the multi-worker production mode.
+
+Starts the backend under gunicorn (DEV_MODE, so no Kroger calls are made) with an
+increasing number of workers and hammers one endpoint from several client processes,
+then prints requests/second and scaling efficiency per worker count.
+
+Workers share state through Redis, as in production; pass --no-redis to measure
+process-local state instead. Run on a machine with at least (max workers + client
+processes) cores, next to a Redis that isn't serving anything else, e.g.:
+    python bench_workers.py --workers 1,2,4,8 --clients 8 --duration 15 --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import redis
+
+DEFAULT_PATH = "/api/products/compare?term=kroger&locationIds=01600425,01400462,01400322"
+
+
+def start_server(workers: int, port: int, redis_url: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DEV_MODE="1",
+        PREFETCH_ENABLED="false",
+        SNAPSHOT_PATH="",
+        PRICE_HISTORY_PATH="",
+        WEB_CONCURRENCY=str(workers),
+        BIND=f"127.0.0.1:{port}",
+        REDIS_URL=redis_url,
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:app", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base_url: str, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def client_loop(url: str, duration: float, concurrency: int) -> int:
+    done = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal done
+        while time.perf_counter() < deadline:
+            resp = await client.get(url)
+            if resp.status_code == 200:
+                done += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+    return done
+
+
+def run_client(args: tuple[str, float, int]) -> int:
+    return asyncio.run(client_loop(*args))
+
+
+def measure(workers: int, opts: argparse.Namespace) -> float:
+    base_url = f"http://127.0.0.1:{opts.port}"
+    proc = start_server(workers, opts.port, opts.redis_url)
+    try:
+        wait_ready(base_url)
+        url = base_url + opts.path
+        # Short warmup so every worker has imported and cached its first response
+        with multiprocessing.Pool(opts.clients) as pool:
+            pool.map(run_client, [(url, 1.0, opts.concurrency)] * opts.clients)
+            counts = pool.map(run_client, [(url, opts.duration, opts.concurrency)] * opts.clients)
+        return sum(counts) / opts.duration
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Connections per client process")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per measurement")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default=DEFAULT_PATH, help="Endpoint to benchmark")
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379/15"), help="Redis shared by the workers")
+    parser.add_argument("--no-redis", action="store_true", help="Keep state in each worker's memory instead")
+    opts = parser.parse_args()
+    if opts.no_redis:
+        opts.redis_url = ""
+    else:
+        # Fail fast rather than timing workers that can't reach their store
+        redis.Redis.from_url(opts.redis_url).ping()
+
+    state = opts.redis_url or "process-local"
+    print(f"cores={os.cpu_count()} clients={opts.clients}x{opts.concurrency} state={state} path={opts.path}")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'efficiency':>10}")
+    baseline = None
+    for workers in [int(w) for w in opts.workers.split(",")]:
+        rps = measure(workers, opts)
+        baseline = baseline or rps
+        speedup = rps / baseline
+        print(f"{workers:>8} {rps:>10.1f} {speedup:>7.2f}x {speedup / workers:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+# Gunicorn settings for the multi-worker production mode (see run.sh prod).
+# Set REDIS_URL so cart, lists, token and product caches are shared between workers.
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Workers get this long after SIGTERM to finish requests and drain upstream calls
+# (keep it above UPSTREAM_DRAIN_SECONDS)
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
+# Recycle workers occasionally to bound memory growth from process-local caches
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = 1000
+accesslog = "-"
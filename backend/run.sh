@@ -1,5 +1,12 @@
 #!/bin/bash
 
 # Start FastAPI backend server
+#   ./run.sh        development server with auto-reload
+#   ./run.sh prod   gunicorn with WEB_CONCURRENCY uvicorn workers (default: one per core)
+if [ "$1" = "prod" ]; then
+    echo "Starting Kroger Shopping AI FastAPI Backend (production, ${WEB_CONCURRENCY:-$(nproc)} workers)..."
+    exec gunicorn app.main:app -c gunicorn.conf.py
+fi
+
 echo "Starting Kroger Shopping AI FastAPI Backend..."
-uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
\ No newline at end of file
+uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
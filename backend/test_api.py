@@ -28,7 +28,7 @@ async def test_locations():
         if response.status_code == 200:
             locations = response.json()
             print(f"✓ Found {len(locations)} locations")
-            return locations[0]["locationId"] if locations else None
+            return [loc["locationId"] for loc in locations]
         else:
             print(f"✗ Location search failed: {response.status_code}")
             return None
@@ -52,6 +52,128 @@ async def test_product_search(location_id):
             print(f"✗ Product search failed: {response.status_code}")
             return None
 
+async def test_price_compare(location_ids):
+    """Test cross-store price comparison"""
+    if not location_ids:
+        print("⚠ Skipping price compare (no locations)")
+        return
+    
+    async with httpx.AsyncClient(timeout=60) as client:
+        response = await client.get(
+            f"{BASE_URL}/api/products/compare",
+            params={"term": "milk", "locationIds": ",".join(location_ids[:3]), "max": 50}
+        )
+        if response.status_code == 200:
+            matrix = response.json()
+            print(f"✓ Compared {len(matrix['products'])} products across {len(matrix['locations'])} stores")
+        else:
+            print(f"✗ Price compare failed: {response.status_code}")
+
+async def test_unit_price_sort(location_id):
+    """Test sorting search results by unit price"""
+    if not location_id:
+        print("⚠ Skipping unit price sort (no location)")
+        return
+
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            f"{BASE_URL}/api/products/search",
+            params={"term": "milk", "locationId": location_id, "limit": 20, "sortBy": "unitPrice"}
+        )
+        if response.status_code == 200:
+            products = response.json()
+            unit_prices = [p["unitPrice"] for p in products if p.get("unitPrice") is not None]
+            assert unit_prices == sorted(unit_prices), "unit prices out of order"
+            assert all(p.get("unitPrice") is None for p in products[len(unit_prices):]), "unsized products not last"
+            print(f"✓ Sorted {len(products)} products by unit price ({len(unit_prices)} with a size)")
+        else:
+            print(f"✗ Unit price sort failed: {response.status_code}")
+
+async def test_price_history(location_id, product):
+    """Test the price history recorded for a searched product"""
+    if not location_id or not product:
+        print("⚠ Skipping price history (no product)")
+        return
+
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            f"{BASE_URL}/api/prices/history",
+            params={"productId": product["productId"], "locationId": location_id}
+        )
+        if response.status_code == 200:
+            history = response.json()
+            assert len(history["points"]) == history["observations"]
+            print(f"✓ Price history: {history['observations']} observations, average ${history['average']:.2f}")
+        else:
+            print(f"✗ Price history failed: {response.status_code}")
+
+async def test_change_feed():
+    """Test that a cart change reaches a change feed subscriber"""
+    async with httpx.AsyncClient(timeout=10) as client:
+        async with client.stream("GET", f"{BASE_URL}/api/changes/stream", params={"channels": "cart"}) as stream:
+            await client.post(
+                f"{BASE_URL}/api/cart/add",
+                json={"productId": "feed-test", "description": "Feed Test", "price": 1.00, "quantity": 1}
+            )
+            event = None
+            async for line in stream.aiter_lines():
+                if line.startswith("data: "):
+                    event = json.loads(line[len("data: "):])
+                    break
+        await client.delete(f"{BASE_URL}/api/cart/remove/feed-test")
+        if event and event["channel"] == "cart":
+            print(f"✓ Change feed sent cart {event['op']} (version {event['version']})")
+        else:
+            print(f"✗ Change feed sent no cart event: {event}")
+
+async def test_jobs(location_id):
+    """Test submitting a background job and polling it to completion"""
+    if not location_id:
+        print("⚠ Skipping background jobs (no location)")
+        return
+
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{BASE_URL}/api/jobs",
+            json={"kind": "sales_all", "params": {"locationId": location_id, "max": 50}}
+        )
+        if response.status_code != 202:
+            print(f"✗ Job submit failed: {response.status_code}")
+            return
+        job = response.json()
+        print(f"✓ Submitted job {job['id']}")
+
+        for _ in range(60):
+            job = (await client.get(f"{BASE_URL}/api/jobs/{job['id']}")).json()
+            if job["status"] in ("done", "failed"):
+                break
+            await asyncio.sleep(1)
+        if job["status"] != "done":
+            print(f"✗ Job ended {job['status']}: {job['error']}")
+            return
+
+        response = await client.get(f"{BASE_URL}/api/jobs/{job['id']}/result")
+        if response.status_code == 200:
+            print(f"✓ Job done with {len(response.json())} sale items")
+        else:
+            print(f"✗ Job result failed: {response.status_code}")
+
+def test_parse_size():
+    """Test package sizes parsed from product descriptions"""
+    from app.main import _parse_size
+
+    cases = {
+        "Kroger 2% Reduced Fat Milk 1/2 gal": (64.0, "oz"),
+        "Coca-Cola 12pk 12 fl oz Cans": (144.0, "oz"),
+        "Coca-Cola Soda 12 ct / 12 fl oz": (144.0, "oz"),
+        "Water 24 ct / 16.9 fl oz": (405.6, "oz"),
+        "Tide Pods 42 ct 2.3 lb": (36.8, "oz"),
+        "Eggs 12 ct": (12.0, "ct"),
+    }
+    for description, expected in cases.items():
+        assert _parse_size(description) == expected, f"{description}: {_parse_size(description)} != {expected}"
+    print(f"✓ Parsed {len(cases)} package sizes")
+
 async def test_cart_operations(product):
     """Test cart operations"""
     async with httpx.AsyncClient() as client:
@@ -108,7 +230,7 @@ async def test_cart_operations(product):
         if response.status_code == 200:
             print("✓ Removed item from cart")
 
-async def test_list_operations():
+async def test_list_operations(location_ids=None):
     """Test shopping list operations"""
     async with httpx.AsyncClient() as client:
         # Create list
@@ -158,6 +280,32 @@ async def test_list_operations():
         if response.status_code == 200:
             print("✓ Retrieved specific shopping list")
         
+        # Optimize list across stores
+        if location_ids:
+            response = await client.get(
+                f"{BASE_URL}/api/lists/{list_id}/optimize",
+                params={"locationIds": ",".join(location_ids[:3]), "maxStores": 2},
+                timeout=60
+            )
+            if response.status_code == 200:
+                plan = response.json()
+                print(f"✓ Optimized list: cheapest single store ${plan['singleStore']['total']:.2f}, split ${plan['split']['total']:.2f}")
+            else:
+                print(f"✗ List optimize failed: {response.status_code}")
+
+            # Cheaper alternatives at one store
+            response = await client.get(
+                f"{BASE_URL}/api/lists/{list_id}/substitutions",
+                params={"locationId": location_ids[0], "k": 3},
+                timeout=60
+            )
+            if response.status_code == 200:
+                subs = response.json()
+                found = sum(len(item["alternatives"]) for item in subs["items"])
+                print(f"✓ Found {found} substitutions from {subs['catalogSize']} cached products")
+            else:
+                print(f"✗ List substitutions failed: {response.status_code}")
+        
         # Delete list
         response = await client.delete(f"{BASE_URL}/api/lists/{list_id}")
         if response.status_code == 200:
@@ -175,7 +323,8 @@ async def main():
         
         # Test location search
         print("Testing Location Services...")
-        location_id = await test_locations()
+        location_ids = await test_locations()
+        location_id = location_ids[0] if location_ids else None
         print()
         
         # Test product search
@@ -183,6 +332,21 @@ async def main():
         product = await test_product_search(location_id)
         print()
         
+        # Test unit prices
+        print("Testing Unit Prices...")
+        await test_unit_price_sort(location_id)
+        print()
+
+        # Test price history
+        print("Testing Price History...")
+        await test_price_history(location_id, product)
+        print()
+
+        # Test cross-store comparison
+        print("Testing Price Comparison...")
+        await test_price_compare(location_ids)
+        print()
+        
         # Test cart operations
         print("Testing Cart Operations...")
         await test_cart_operations(product)
@@ -190,7 +354,22 @@ async def main():
         
         # Test shopping lists
         print("Testing Shopping Lists...")
-        await test_list_operations()
+        await test_list_operations(location_ids)
+        print()
+
+        # Test the change feed
+        print("Testing Change Feed...")
+        await test_change_feed()
+        print()
+
+        # Test background jobs
+        print("Testing Background Jobs...")
+        await test_jobs(location_id)
+        print()
+
+        # Test package size parsing (imports the app, so it runs last)
+        print("Testing Package Sizes...")
+        test_parse_size()
         print()
         
         print("=" * 40)
@@ -255,7 +255,7 @@ export default function App() {
     }
     setLoadingSales(true)
     try {
-      const r = await fetch(`${apiBase}/api/products/sales/all?locationId=${encodeURIComponent(key)}&max=200`)
+      const r = await fetch(`${apiBase}/api/products/sales/all?locationId=${encodeURIComponent(key)}&max=200&fresh=${force ? 'true' : 'false'}`)
       if (!r.ok) {
         const errorData = await r.text()
         throw new Error(errorData || `HTTP ${r.status}`)